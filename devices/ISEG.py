@@ -5,9 +5,19 @@ import warnings
 from serial import Serial, PARITY_NONE, STOPBITS_ONE, EIGHTBITS, SerialException
 from devices.device import *
 from typing import Any
+from numpy import unique
+from devices.cache import cached
+from devices.codec import encode, decode, parse_floats
+from devices.events import EmergencyOffEvent, InhibitEvent, TripEvent, CurrentLimitEvent, VoltageLimitEvent
 
 
 class ISEG(Device):
+
+    CacheTTL = {'read_iv': .5, 'get_all_channel_status': 1}
+    Units = b'AVC/s%'  # stripped from the numeric answers
+    EventStatus = {'EmergencyOff': EmergencyOffEvent, 'ExtInhibit': InhibitEvent, 'TripExceeded': TripEvent, 'CurrentLimitExceeded': CurrentLimitEvent,
+                   'VoltageLimitExceeded': VoltageLimitEvent}  # channel status flags that raise an event
+
     def __init__(self, device_no, config='main', hot_start=True, print_logs=False):
 
         Device.__init__(self, device_no, config, hot_start, print_logs)
@@ -29,13 +39,7 @@ class ISEG(Device):
         self.open_serial_port()
 
         # Info
-        self.Busy = False
         self.last_write = ''
-        self.LastMeasurement = -1
-        self.LastCurrents = []
-        self.LastVoltages = []
-        self.LastStatusUpdate = -1
-        self.LastStatus = []
         self.lastVoltage = 0
         self.CanRamp = True
 
@@ -53,6 +57,11 @@ class ISEG(Device):
             warning('Could not open serial port: {}'.format(self.SerialPortName))
             self.bOpen = False
 
+    def connect(self):
+        if self.bOpen:
+            self.Serial.close()
+        self.open_serial_port()
+
     def init_device(self, hot_start):
         if hot_start:
             sleep(1)
@@ -95,12 +104,22 @@ class ISEG(Device):
     def set_bias(self, voltage, channel=None):
         self.write(':VOLT {v:.3f},{ch}'.format(v=voltage, ch=self.make_channel_string(channel)))
 
+    def set_biases(self, voltages, channels):
+        """ Channels with the same setpoint share a single write using a channel list. """
+        voltages, channels = array(voltages), array(channels)
+        for voltage in unique(voltages):
+            self.set_bias(voltage, channels[voltages == voltage].tolist())
+
     def set_emergency_off(self, channel='all'):
+        self.clear_setpoints()
         ch_str = self.make_channel_string(channel)
         print('Emergency off for channel(s) %s' % channel)
         data = ':VOLT EMCY OFF,{ch}'.format(ch=ch_str)
         return self.write(data)
 
+    def write_emergency_off(self):
+        return self.__write(':VOLT EMCY OFF,{}'.format(self.make_channel_string('all')))
+
     def set_emergency_clear(self, channel='all'):
         ch_str = self.make_channel_string(channel)
         print('Emergency clear for channel(s) %s' % channel)
@@ -137,7 +156,9 @@ class ISEG(Device):
         info('Set ramp speed to {}'.format(speed))
         self.configure_ramp_speed('VOLT', speed)
 
-    def set_ramp_speed(self, speed):
+    def set_ramp_speed(self, speed, channel=0):
+        """ The ramp speed is the same for all channels of the module. """
+        self.RampSpeed[:] = speed
         self.configure_ramp_speed_voltage(speed)
 
     def configure_ramp_speed_current(self, speed=None):
@@ -174,21 +195,19 @@ class ISEG(Device):
     # todo :CONF:EV:CHANMASK
 
     def read_current(self, channel):
-        return [float(word[:-1]) for word in self.get_answer_for_query(':MEAS:CURR?{}'.format(self.make_channel_string(channel))).split()]
+        return self.query_floats(':MEAS:CURR?{}'.format(self.make_channel_string(channel)))
 
     def read_voltage(self, channel):
-        return [float(word[:-1]) for word in self.get_answer_for_query(':MEAS:VOLT?{}'.format(self.make_channel_string(channel))).split()]
+        return self.query_floats(':MEAS:VOLT?{}'.format(self.make_channel_string(channel)))
 
+    @cached
     def read_iv(self):
-        now = time()
-        if now - self.LastMeasurement > .5:
-            self.clear_buffer()
-            self.LastCurrents = self.read_current(ALL)
-            self.LastVoltages = self.read_voltage(ALL)
-            self.LastMeasurement = now
-        return [{'voltage': v, 'current': c} for v, c in zip(self.LastVoltages, self.LastCurrents)]
+        self.clear_buffer()
+        currents = self.read_current(ALL)
+        return [{'voltage': v, 'current': c} for v, c in zip(self.read_voltage(ALL), currents)]
 
     def reset(self):
+        self.clear_setpoints()
         self.write('*RST')
         self.Serial.readall()
         return self.Serial.inWaiting()
@@ -199,104 +218,96 @@ class ISEG(Device):
         return self.Serial.inWaiting()
 
     def clear_buffer(self, warning=True, command=''):
-        busy = self.Busy
-        self.Busy = True
         retval = ''
-        if self.bOpen:
-            while self.Serial.inWaiting():
+        with self.Lock:
+            if self.bOpen:
                 while self.Serial.inWaiting():
-                    retval += self.__read()
-                sleep(self.ReadSleepTime)
-        else:
-            pass
+                    while self.Serial.inWaiting():
+                        retval += self.__read()
+                    sleep(self.ReadSleepTime)
         if retval != '' and warning:
             msg = 'Buffer was not empty when reading  %s: "%s"' % (command, retval)
             msg += ',\n\t last command: "%s"' % self.last_write
             warnings.warn(msg)
-        self.Busy = busy
         return self.Serial.inWaiting()
 
     # ============================
     # region ACCESS FUNCTIONS
-    def wait_for_unbusy(self):
-        now = time()
-        while self.Busy:
-            sleep(.1)
-            if time() - now > 20:
-                self.Busy = False
-                warnings.warn('Device stucked. Waiting for more than 20sec to unbusy - Reset Busy')
-
     def get_answer_for_query(self, data, minlength=1):
-        self.wait_for_unbusy()
-        self.Busy = True
-        self.clear_buffer(command=data)
-        self.__write(data)
-        sleep(self.ReadSleepTime)
-        data = self.__read(minlength)
-        self.Busy = False
-        return clear_string(data)
+        return clear_string(self.query_raw(data, minlength))
+
+    def query_floats(self, data, minlength=1):
+        """ :returns: the comma separated answer to [data] parsed straight from the received bytes without the units. """
+        return parse_floats(self.query_raw(data, minlength), self.Units)
+
+    def query_raw(self, data, minlength=1):
+        with self.Lock:
+            self.clear_buffer(command=data)
+            self.__write(data)
+            if self.CompletionSync and self.bOpen:
+                return self.__read_answer()
+            sleep(self.ReadSleepTime)
+            return self.__read_raw(minlength)
 
     def write(self, data):
-        self.wait_for_unbusy()
-        self.Busy = True
-        self.__write(data)
-        self.Busy = False
+        with self.Lock:
+            return self.__write(data)
 
     def __write(self, data):
         # print 'write: "%s"' % data
-        data += self.CommandEndCharacter
         self.last_write = data
+        data = encode(data, self.CommandEndCharacter)
         output = self.Serial.write(data) if self.bOpen else True
-        sleep(self.WriteSleepTime)
+        self.sync(lambda: self.bOpen and self.__read_line() == data, self.WriteSleepTime)  # the module echoes every command it parsed
         return output == len(data)
 
+    def __read_line(self):
+        """ Block until the next line arrives or the serial timeout expired. """
+        return self.Serial.read_until(encode('', self.CommandEndCharacter))
+
+    def __read_answer(self, max_time=10):
+        """ Block until the next line which is not an echo of a command arrives. :returns: empty bytes if nothing arrived in time. """
+        ts = time()
+        line = self.__read_line()
+        while ISEG.is_echo(line) and time() - ts < max_time:
+            line = self.__read_line()
+        return b'' if ISEG.is_echo(line) else line
+
+    @staticmethod
+    def is_echo(line):
+        return line.startswith((b'*', b':'))
+
     def read(self, min_lenght=0):
-        self.wait_for_unbusy()
-        self.Busy = True
-        self.__read(min_lenght)
-        self.Busy = False
+        with self.Lock:
+            return decode(self.__read_raw(min_lenght))
 
     def __read(self, min_lenght=0):
-        # if not self.serial.inWaiting():
-        #     print 'there is nothing in the queue'
-        #     return
-        out = ''
+        return decode(self.__read_raw(min_lenght))
+
+    def __read_raw(self, min_lenght=0):
+        """ :returns: the bytes of the next line which is not an echo of a command or empty bytes if nothing is waiting. """
         if not self.bOpen:
             if not self.bOpenInformed:
                 print('cannot read since Not serial port is not open')
                 self.bOpenInformed = False
-            return ''
+            return b''
+        end = encode('', self.CommandEndCharacter)
         ts = time()
         max_time = 300
-        k = 0
-        clear_first = False
-        while True:
-            while self.Serial.inWaiting() > 0 and time() - ts < max_time and not out.endswith(self.CommandEndCharacter):
-                out += self.Serial.read(1)
-                k += 1
-            if out == '':
-                break
-            if out.endswith(self.CommandEndCharacter):
-                if out.startswith('*') or out.startswith(':'):
-                    out = ''
+        out = bytearray()
+        while (out or self.Serial.inWaiting()) and time() - ts < max_time:
+            out += self.Serial.read_until(end)  # the whole line at once, blocks at most for the serial timeout
+            if out.endswith(end):
+                if ISEG.is_echo(out):
+                    out = bytearray()
                     continue
-                else:
-                    break
-            if time() - ts > max_time:
                 break
             if 0 < min_lenght <= len(out):
                 break
-            sleep(self.ReadSleepTime)
         if time() - ts > max_time:
-            print("Tried reading for %s seconds." % (time() - ts), out)
-            try:
-                print(ord(out[-2]), ord(out[-1]), ord(self.CommandEndCharacter[0]), ord(self.CommandEndCharacter[1]))
-            except IndexError:
-                print("Error trying: 'print ord(out[-2]),ord(out[-1]),"
-                      "ord(self.commandEndCharacter[0]),ord(self.commandEndCharacter[1]),len(out)'")
-            return ''
-        # print 'received after %s tries: %s' % (k, out)
-        return out
+            print("Tried reading for %s seconds." % (time() - ts), bytes(out))
+            return b''
+        return bytes(out)
     # endregion
 
     # ============================
@@ -319,32 +330,34 @@ class ISEG(Device):
     def get_output_status(self, channel=None):
         return self.get_channel_control(channel)['SetOn']
 
+    def get_output_statuses(self, channels=None):
+        """ Reads the control words of all channels with a single query. """
+        control = self.get_bit_list(':READ:CHAN:CONT?')
+        return [self.convert_channel_control(control[channel])['SetOn'] for channel in choose(channels, self.ActiveChannels)]
+
+    def update_status(self):
+        Device.update_status(self)
+        self.get_all_channel_status()  # refresh the ramping flags for is_ramping (cached for its time to live)
+
     def is_ramping(self, channel=0):
-        return self.LastStatus[channel]['Ramping']
+        status = self.Cache.peek('get_all_channel_status')  # do not block the GUI with a query
+        return status[channel]['Ramping'] if status else False
 
     def query_set_voltage(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:VOLT?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:VOLT?%s' % ch_str)
 
     def query_voltage_limit(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:VOLT:LIM?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:VOLT:LIM?%s' % ch_str)
 
     def query_voltage_nominal(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:VOLT:NOM?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:VOLT:NOM?%s' % ch_str)
 
     def query_voltage_bounds(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:VOLT:BOU?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:VOLT:BOU?%s' % ch_str)
 
     def query_channel_on(self, ch=-1):
         ch_str = self.make_channel_string(ch)
@@ -360,36 +373,26 @@ class ISEG(Device):
 
     def query_set_current(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:CURR?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:CURR?%s' % ch_str)
 
     def query_set_current_limit(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        value = self.get_answer_for_query(':READ:CURR:LIM?%s' % ch_str).split()
-        value = [float(k[:-1]) for k in value]
-        return value
+        return self.query_floats(':READ:CURR:LIM?%s' % ch_str)
 
     def query_set_current_nominal(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        retval = self.get_answer_for_query(':READ:CURR:NOM?%s' % ch_str).split()
-        retval = [float(k[:-1]) for k in retval]
-        return retval
+        return self.query_floats(':READ:CURR:NOM?%s' % ch_str)
 
     def query_set_current_bounds(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        retval = self.get_answer_for_query(':READ:CURR:BOU?%s' % ch_str).split()
-        retval = [float(k[:-1]) for k in retval]
-        return retval
+        return self.query_floats(':READ:CURR:BOU?%s' % ch_str)
 
     '''
         Unit: %/s TODO
     '''
 
     def query_module_voltage_ramp_speed(self):
-        retval = self.get_answer_for_query(':READ:RAMP:VOLT?')
-        retval = float(retval[:-3])
-        return retval
+        return self.query_floats(':READ:RAMP:VOLT?')[0]
 
     '''
         Unit: V/s
@@ -397,18 +400,14 @@ class ISEG(Device):
 
     def query_channel_voltage_ramp_speed(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        retval = self.get_answer_for_query(':READ:RAMP:VOLT?%s' % ch_str).split()
-        retval = [float(k[:-3]) for k in retval]
-        return retval
+        return self.query_floats(':READ:RAMP:VOLT?%s' % ch_str)
 
     '''
         Unit: %/s TODO
     '''
 
     def query_module_current_ramp_speed(self):
-        retval = self.get_answer_for_query(':READ:RAMP:CURR?')
-        retval = float(retval[:-3])
-        return retval
+        return self.query_floats(':READ:RAMP:CURR?')[0]
 
     '''
         Unit: A/s
@@ -416,21 +415,19 @@ class ISEG(Device):
 
     def query_channel_current_ramp_speed(self, ch=-1):
         ch_str = self.make_channel_string(ch)
-        retval = self.get_answer_for_query(':READ:RAMP:CURR?%s' % ch_str).split()
-        retval = [float(k[:-3]) for k in retval]
-        return retval
+        return self.query_floats(':READ:RAMP:CURR?%s' % ch_str)
 
     def query_module_supply_voltage_p24(self):
-        return float(self.get_answer_for_query(':READ:MOD:SUP:P24V?')[:-1])
+        return self.query_floats(':READ:MOD:SUP:P24V?')[0]
 
     def query_module_supply_voltage_n24(self):
-        return float(self.get_answer_for_query(':READ:MOD:SUP:N24V?')[:-1])
+        return self.query_floats(':READ:MOD:SUP:N24V?')[0]
 
     def query_module_supply_voltage_p5(self):
-        return float(self.get_answer_for_query(':READ:MOD:SUP:P5V?')[:-1])
+        return self.query_floats(':READ:MOD:SUP:P5V?')[0]
 
     def query_module_temperature(self):
-        return float(self.get_answer_for_query(':READ:MOD:TEMP?')[:-1])
+        return self.query_floats(':READ:MOD:TEMP?')[0]
 
     def query_module_channels(self):
         return int(self.get_answer_for_query(':READ:MOD:CHAN?'))
@@ -441,25 +438,26 @@ class ISEG(Device):
     def query_firmware_release(self):
         return self.get_answer_for_query(':READ:FIRM:REL?')
 
+    @cached
     def get_all_channel_status(self):
-        now = time()
-        if now - self.LastStatusUpdate > 1:
-            while True:
-                try:
-                    bitmasks = self.get_answer_for_query(':READ:CHAN:STAT?{}'.format(self.make_channel_string(ALL))).split()
-                    self.LastStatus = [self.convert_channel_status(int(bitmask)) for bitmask in bitmasks]
-                    self.LastStatusUpdate = now
-                    return self.LastStatus
-                except Exception as err:
-                    warning('No valid channel status, retry: {}'.format(err))
-                    self.clear_buffer(warning=False)
-        return self.LastStatus
+        while True:
+            try:
+                bitmasks = self.get_answer_for_query(':READ:CHAN:STAT?{}'.format(self.make_channel_string(ALL))).split()
+                return [self.convert_channel_status(int(bitmask)) for bitmask in bitmasks]
+            except Exception as err:
+                warning('No valid channel status, retry: {}'.format(err))
+                self.clear_buffer(warning=False)
 
     def get_channel_status(self, channel):
-        self.get_all_channel_status()
-        while not self.LastStatus:
-            self.get_all_channel_status()
-        return self.LastStatus[channel]
+        return self.get_all_channel_status()[channel]
+
+    def check_events(self):
+        """ Derives the events from the live channel status, which update_status has just refreshed, so it costs no extra query.
+            The latched event status is not used since its bits stay set until they are reset. """
+        status = self.get_all_channel_status()
+        for channel in self.ActiveChannels:
+            for flag, event_type in ISEG.EventStatus.items():
+                self.set_condition(event_type, channel, status[channel][flag])
 
     ''' Channel Event Status (read-write access)
             :READ:CHANnel:EVent:STATus?
@@ -4,8 +4,12 @@ import inspect
 import os
 import sys
 from collections import deque
+from contextlib import contextmanager
+from numpy import inf
 import serial
 from .device import *
+from .events import ComplianceEvent
+from .codec import encode, decode, parse_floats
 
 
 currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentframe())))
@@ -14,6 +18,10 @@ sys.path.insert(0, parentdir)
 
 
 class Keithley(Device):
+
+    InputBuffer = 256  # maximum length of a command line including the terminator
+    ResetCommands = ('*RST', '*RCL', 'SYST:PRES', 'CONF')  # change many settings at once
+
     def __init__(self, device_no, config, hot_start=False):
 
         Device.__init__(self, device_no, config, hot_start)
@@ -28,7 +36,11 @@ class Keithley(Device):
 
         self.writeSleepTime = 0.1
         self.readSleepTime = 0.2
-        self.measurements = deque()
+        self.ReadTimeout = self.Config.get_value('read timeout', float, default=10)
+        self.Batch = None  # commands collected inside batch()
+        self.measurements = deque(maxlen=100)  # the full history is kept in Device.History
+        self.TimeIndex = None  # position of the time stamp in the answer to :READ? if it is part of the output format
+        self.StatusIndex = None  # position of the status word
         self.last_voltage = 0
         self.identifier = None
         self.Model = None
@@ -37,6 +49,9 @@ class Keithley(Device):
         self.open_serial_port()
 
     def connect(self):
+        if self.bOpen:
+            self.serial.close()
+        self.Cache.invalidate()  # the instrument may have been reset or replaced
         self.open_serial_port()
 
     def open_serial_port(self):
@@ -54,15 +69,16 @@ class Keithley(Device):
         return self.serial.isOpen()
 
     def is_tripped(self, statusword):
-        bit = 0x08
-        if int(statusword) & bit == bit:
-            warning('keithley is tripped')
+        if self.check_status_word(statusword):
             self.clear_error_queue()
             self.clear_buffer()
-            sleep(1)
             return True
         return False
 
+    def check_status_word(self, statusword):
+        """ Publish the compliance state from the status word which is part of every reading. :returns: whether the device is in compliance. """
+        return self.set_condition(ComplianceEvent, 0, int(float(statusword)) & 0x08, 'status word {}'.format(int(float(statusword))))
+
     # ============================
     # DEVICE FUNCTIONS
     def set_output(self, status, channel=0):
@@ -71,7 +87,12 @@ class Keithley(Device):
         data = ':OUTP {}'.format(out)
         return self.write(data)
 
+    def write_emergency_off(self):
+        if self.bOpen:
+            self.serial.write(encode(':OUTP OFF', self.commandEndCharacter))
+
     def reset(self):
+        self.clear_setpoints()
         return self.write('*RST')
 
     def clear_error_queue(self):
@@ -86,8 +107,8 @@ class Keithley(Device):
             pass
         return self.write(':TRAC:CLEAR')
 
-    def identify(self):
-        self.identifier = self.get_answer_for_query('*IDN?')
+    def identify(self, refresh=False):
+        self.identifier = self.query_setting('*IDN?', refresh)
         self.get_model_name()
 
     # ============================
@@ -163,59 +184,134 @@ class Keithley(Device):
         else:
             raise Exception('serial ports do not match!')
 
-    def get_trigger_count(self):
-        data = self.get_answer_for_query(':TRIG:COUN?')
+    def get_trigger_count(self, refresh=False):
+        data = self.query_setting(':TRIG:COUN?', refresh)
         if data == '':
             return -1
         return data if 0 <= int(data) <= 2500 else -1
 
     # ============================
     # ACCESS FUNCTIONS
-    def get_answer_for_query(self, data, minlength=1):
-        self.write(data)
-        sleep(self.readSleepTime)
-        data = self.read(minlength)
+    def get_answer_for_query(self, data, minlength=1, timeout=None):
+        """ :param timeout: deadline for the answer in seconds, default: 'read timeout' from the config. """
+        with self.Lock:
+            self.write(data)
+            data = self.read_raw(minlength, timeout)
         return clear_string(data)
 
+    def query_floats(self, data, minlength=1, timeout=None):
+        """ :returns: the comma separated answer to [data] parsed straight from the received bytes into an array. """
+        with self.Lock:
+            self.write(data)
+            return parse_floats(self.read_raw(minlength, timeout))
+
+    @contextmanager
+    def batch(self):
+        """ Collect the commands written inside the block and send them joined by ';' in as few lines as the input buffer allows.
+            Queries send the collected commands first. The error queue is checked once at the end. """
+        with self.Lock:
+            if self.Batch is not None:  # nested
+                yield
+                return
+            self.Batch = []
+            try:
+                yield
+                self.flush_batch()
+            finally:
+                self.Batch = None
+            self.check_errors()
+
+    def flush_batch(self):
+        commands, self.Batch = self.Batch, []
+        for line in self.join_commands(commands):
+            self.write_line(line)
+
+    def join_commands(self, commands):
+        """ :returns: the commands joined by ';' into lines which fit into the input buffer, leaving room for ';*OPC?'. """
+        lines = []
+        size = self.InputBuffer - len(';*OPC?' + self.commandEndCharacter)
+        for command in commands:
+            command = command if command.startswith((':', '*')) else ':' + command  # every command starts from the root of the tree
+            if lines and len(lines[-1]) + len(command) < size:
+                lines[-1] += ';' + command
+            else:
+                lines.append(command)
+        return lines
+
+    def check_errors(self):
+        """ Read the whole error queue with a single query. :returns: whether it was empty. """
+        with self.Lock:
+            self.write(':SYST:ERR:ALL?')
+            answer = decode(self.read_raw(1)).strip()
+        if answer and not answer.startswith('0,'):
+            warning('{} reported errors: {}'.format(self.Config.Section, answer))
+        return answer.startswith('0,')
+
+    @staticmethod
+    def get_header(command):
+        """ :returns: the normalised header of a command or query, e.g. 'TRIG:COUN' for ':trig:coun 5' or ':TRIG:COUN?'. """
+        return command.split(maxsplit=1)[0].lstrip(':').rstrip('?').upper() if command.strip() else ''
+
+    def query_setting(self, query, refresh=False):
+        """ :returns: the answer to the query of a setting from the cache. The instrument is only asked again if the setting
+            was written in the meantime or [refresh] is set. Setters must use the same spelling of the header as the query. """
+        header = self.get_header(query)
+        if refresh:
+            self.Cache.invalidate(header)
+        answer = self.Cache.get(header, self.get_answer_for_query, inf, query)
+        if answer == '':
+            self.Cache.invalidate(header)  # no answer, ask again next time
+        return answer
+
+    def invalidate_settings(self, command):
+        header = self.get_header(command)
+        self.Cache.invalidate(None if header.startswith(self.ResetCommands) else header)
+
     def write(self, data):
-        data += self.commandEndCharacter
-        if self.bOpen:
-            output = self.serial.write(data)
-        else:
-            output = True
-        sleep(self.writeSleepTime)
+        if '?' not in data:
+            with self.Lock:  # not while a query of the same setting is in flight
+                self.invalidate_settings(data)
+        if self.Batch is not None:
+            if '?' not in data:
+                self.Batch.append(data)
+                return True
+            self.flush_batch()
+        return self.write_line(data)
+
+    def write_line(self, data):
+        """ With 'completion sync' *OPC? is appended to commands and its answer awaited instead of sleeping [writeSleepTime].
+            Queries neither wait nor sleep since reading their answer blocks anyway. """
+        query = '?' in data
+        opc = self.CompletionSync and self.bOpen and not query
+        data = encode(data + (';*OPC?' if opc else ''), self.commandEndCharacter)
+        with self.Lock:
+            if self.bOpen:
+                output = self.serial.write(data)
+            else:
+                output = True
+            if not query:
+                self.sync(lambda: self.bOpen and self.read_raw(1).strip() == b'1', self.writeSleepTime)
         return output == len(data)
 
-    def read(self, min_lenght=0):
-        out = ''
+    def read(self, min_lenght=0, timeout=None):
+        return decode(self.read_raw(min_lenght, timeout))
+
+    def read_raw(self, min_lenght=0, timeout=None):
+        """ Block until the line terminator arrives or [timeout] seconds passed.
+            :returns: the bytes of the full line, the partial answer if it has at least [min_lenght] characters or empty bytes on timeout. """
         if not self.bOpen:
             if not self.bOpenInformed:
                 print('cannot read since Not serial port is not open')
                 self.bOpenInformed = False
-            return ''
-        ts = time()
-        max_time = 300
-        k = 0
-        while True:
-            while self.serial.inWaiting() > 0 and time() - ts < max_time and not out.endswith(self.commandEndCharacter):
-                out += self.serial.read(1)
-                k += 1
-            if out.endswith(self.commandEndCharacter):
-                break
-            if time() - ts > max_time:
-                break
-            if 0 < min_lenght <= len(out):
-                break
-            sleep(self.readSleepTime)
-        if time() - ts > max_time:
-            print(("Tried reading for %s seconds." % (time() - ts), out))
-            try:
-                print((ord(out[-2]), ord(out[-1]), ord(self.commandEndCharacter[0]), ord(self.commandEndCharacter[1])))
-            except IndexError:
-                print("Error trying: 'print ord(out[-2]),ord(out[-1]),"
-                      "ord(self.commandEndCharacter[0]),ord(self.commandEndCharacter[1]),len(out)'")
-            return ''
-        # print 'received after %s tries: %s' % (k, out)
+            return b''
+        timeout = self.ReadTimeout if timeout is None else timeout
+        if self.serial.timeout != timeout:
+            self.serial.timeout = timeout  # read_until uses it as deadline for the whole line
+        end = encode('', self.commandEndCharacter)
+        out = self.serial.read_until(end)
+        if not out.endswith(end) and not 0 < min_lenght <= len(out):
+            warning('No answer within {} s, received "{}"'.format(timeout, decode(out)))
+            return b''
         return out
 
     # ============================
@@ -233,21 +329,24 @@ class Keithley(Device):
         pass
 
     def read_iv(self):
-        answer = self.get_answer_for_query(':READ?', 20)
+        measurement = None
         try:
-            answer = answer.split()
-            voltage = float(answer[0])
-            current = float(answer[1])
+            measurement = self.query_floats(':READ?', 20)
+            voltage, current = measurement[:2]
             if self.Model == '6517B':
                 [voltage, current] = [current, voltage]
 
-            rest = answer[2:] if len(answer) > 2 else None
-            measurement = [float(x) for x in answer]
+            rest = measurement[2:] if len(measurement) > 2 else None
             self.measurements.append(measurement)
-            return [{'current': current, 'voltage': voltage, 'rest': rest}]
+            data = {'current': current, 'voltage': voltage, 'rest': rest}
+            if self.TimeIndex is not None and len(measurement) > self.TimeIndex:
+                data['time'] = measurement[self.TimeIndex]
+            if self.StatusIndex is not None and len(measurement) > self.StatusIndex:
+                self.check_status_word(measurement[self.StatusIndex])
+            return [data]
         except Exception as err:
             print(err)
-            raise Exception('Could not perform valid IV Measurement, received "%s"' % answer)
+            raise Exception('Could not perform valid IV Measurement, received "%s"' % measurement)
 
     # ============================
     # HELPER FUNCTIONS
@@ -10,6 +10,7 @@ parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 from .Keithley import *
 from time import sleep, time
+from .codec import encode, decode
 import math
 
 
@@ -19,7 +20,6 @@ import math
 class Keithley23X(Keithley):
     def __init__(self, device_no, config, hot_start=False, init=True):
         Keithley.__init__(self, device_no, config, hot_start)
-        self.Busy = False
         self.bOpen = False
         self.read_config()
         self.lastVoltage = 0
@@ -178,39 +178,29 @@ class Keithley23X(Keithley):
         return self.__write(message)[1][-1]
 
     def __write(self, message, max_time=10):
-        time0 = time()
-        while self.Busy:
-            if time() - time0 > 10:
-                raise Exception('Cannot write - device is busy')
+        with self.Lock:
+            if not message.startswith('++') and (not message.endswith('\r\n')):
+                message += '\r\n'
+            if not self.bOpen:
+                return -1, []
+            retVal = self.serial.write(encode(message, ''))
+            time0 = time()
+            while not self.serial.inWaiting():
+                time1 = time()
+                if time1 - time0 > max_time:
+                    break
+                pass
+            # print 'DELTA T: ', time1-time0
             sleep(.1)
-        self.Busy = True
-        if not message.startswith('++') and (not message.endswith('\r\n')):
-            message += '\r\n'
-        if not self.bOpen:
-            self.Busy = False
-            return -1, []
-        retVal = self.serial.write(message)
-        time0 = time()
-        while not self.serial.inWaiting():
-            time1 = time()
-            if time1 - time0 > max_time:
-                break
-            pass
-        # print 'DELTA T: ', time1-time0
-        sleep(.1)
-        retMsg = []
-        exception_counter = 0
-        while self.serial.inWaiting() and exception_counter < 10:
-            try:
-                retMsg.append(self.serial.readline().strip('\r\n'))
-            except serial.SerialException as e:
-                print('Serial Exception! ', e)
-                exception_counter += 1
-            except Exception as e:
-                self.Busy = False
-                raise e
-        self.Busy = False
-        return retVal, retMsg
+            retMsg = []
+            exception_counter = 0
+            while self.serial.inWaiting() and exception_counter < 10:
+                try:
+                    retMsg.append(decode(self.serial.readline()).strip('\r\n'))
+                except serial.SerialException as e:
+                    print('Serial Exception! ', e)
+                    exception_counter += 1
+            return retVal, retMsg
 
     def set_eoi_and_bus_hold_off(self, eoi, hold_off):
         val = ((not eoi) << 0) + ((not hold_off) << 1)
@@ -223,6 +213,10 @@ class Keithley23X(Keithley):
             return self.__execute('N0')
         pass
 
+    def write_emergency_off(self):
+        if self.bOpen:
+            self.serial.write(encode('N0X'))
+
     def set_bias(self, voltage, channel=None):
         if not -1100 < voltage < 1100:
             raise Exception('Range of Keithley 237 is from -1100.0 V to 1100.0 V')
@@ -753,13 +747,16 @@ class Keithley23X(Keithley):
         converted = self.extract_data(retVal)
         current = converted['measure_value']
         voltage = converted['source_value']
-        return {'current': current, 'voltage': voltage}
+        data = {'current': current, 'voltage': voltage}
+        if 'timestamp_value' in converted:
+            data['time'] = converted['timestamp_value']
+        return [data]
 
     def read_current(self):
-        return self.read_iv()['current']
+        return self.read_iv()[0]['current']
 
     def read_voltage(self):
-        return self.read_iv()['voltage']
+        return self.read_iv()[0]['voltage']
         pass
 
     def get_model_name(self):
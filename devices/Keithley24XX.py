@@ -6,6 +6,7 @@ from .Keithley import *
 class Keithley24XX(Keithley):
     def __init__(self, device_no, config, hot_start=False):
         Keithley.__init__(self, device_no, config, hot_start)
+        self.TimeIndex, self.StatusIndex = 3, 4  # VOLT,CURR,RES,TIME,STAT
         self.removeCharacters = '\r\n\x00\x13\x11\x10'
         self.init_keithley(hot_start)
         self.output = ''
@@ -15,24 +16,23 @@ class Keithley24XX(Keithley):
         sleep(.2)
         self.clear_buffer()
         self.identify()
-        self.set_source_output()
-        self.set_voltage_range(self.MaxVoltage)
-        self.set_measurement_speed(2)  # was 10 before
-
-        if not hot_start:
-            self.set_output(OFF)
-            self.reset()
+        with self.batch():
             self.set_source_output()
-            self.set_fixed_volt_mode()
-            self.set_standard_output_format(':FORM:ELEM VOLT,CURR,RES,TIME,STAT')
-            self.set_concurrent_measurement(True)
-            self.set_filter_type('REP')
-            self.set_average_filter(True)
-            self.set_average_filter_count(3)
-            self.set_current_protection(100e-6)
-            self.set_compliance_abort_level('LATE')
-
-        sleep(.3)
+            self.set_voltage_range(self.MaxVoltage)
+            self.set_measurement_speed(2)  # was 10 before
+
+            if not hot_start:
+                self.set_output(OFF)
+                self.reset()
+                self.set_source_output()
+                self.set_fixed_volt_mode()
+                self.set_standard_output_format(':FORM:ELEM VOLT,CURR,RES,TIME,STAT')
+                self.set_concurrent_measurement(True)
+                self.set_filter_type('REP')
+                self.set_average_filter(True)
+                self.set_average_filter_count(3)
+                self.set_current_protection(100e-6)
+                self.set_compliance_abort_level('LATE')
         self.clear_error_queue()
 
     # ============================
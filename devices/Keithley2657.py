@@ -13,7 +13,7 @@ currentdir = os.path.dirname(os.path.abspath(inspect.getfile(inspect.currentfram
 parentdir = os.path.dirname(currentdir)
 sys.path.insert(0, parentdir)
 from .Keithley import *
-from time import sleep
+from .codec import parse_floats
 
 
 class Keithley2657(Keithley):
@@ -67,6 +67,11 @@ class Keithley2657(Keithley):
         print('DONE')
         self.clear_readout()
 
+    def connect(self):
+        if self.inst is not None:
+            self.inst.close()
+        self.open_tcp_connection()
+
     def clear_readout(self):
         print('clear_readout')
         timeout = self.inst.timeout
@@ -123,13 +128,22 @@ class Keithley2657(Keithley):
             error_count, error_code, msg = self.get_next_error_message()
 
     def __query(self, query):
-        retVal = self.inst.query(query).strip('\n')
-        self.__check_for_errors(query)
+        with self.Lock:
+            retVal = self.inst.query(query).strip('\n')
+            self.__check_for_errors(query)
+        return retVal
+
+    def __query_raw(self, query):
+        with self.Lock:
+            self.inst.write(query)
+            retVal = self.inst.read_raw()
+            self.__check_for_errors(query)
         return retVal
 
     def __write(self, value):
-        retVal = self.inst.write(value)
-        self.__check_for_errors(value)
+        with self.Lock:
+            retVal = self.inst.write(value)
+            self.__check_for_errors(value)
         # sleep(.1)
         return retVal
 
@@ -252,6 +266,7 @@ class Keithley2657(Keithley):
 
     def reset(self):
         print('reset')
+        self.clear_setpoints()
         return self.__write('smua.reset()')
 
     def set_voltage_source_function(self):
@@ -261,9 +276,13 @@ class Keithley2657(Keithley):
         # print 'set_bias: ',voltage,type(voltage)
         retVal = self.__write('smua.source.levelv = %f' % voltage)
         self.target_voltage = voltage
-        sleep(.5)
+        self.sync(self.wait_complete, .5)
         return self.get_bias()
 
+    def wait_complete(self):
+        """ Block until all overlapped operations of the instrument finished. """
+        return self.__query('waitcomplete() print(1)') == '1'
+
     def is_in_compliance(self):
         return self.print_bool('smua.source.compliance')
 
@@ -302,11 +321,10 @@ class Keithley2657(Keithley):
         return self.print_float('smua.measure.v()')
 
     def read_iv(self):
-        retVal = self.__print('smua.measure.iv()')
-        compl = self.is_in_compliance()
-        retVal = retVal.split('\t')
-        voltage = float(retVal[1])
-        current = float(retVal[0])
+        # read the compliance in the same transaction, print separates the values by tabs
+        # Lua cuts a multi-value call down to its first value if it is not the last expression, so store both values first
+        current, voltage, compl = parse_floats(self.__query_raw('local i, v = smua.measure.iv() ' + self.__print_string('i, v, smua.source.compliance and 1 or 0')), sep=b'\t')
+        compl = self.set_condition(ComplianceEvent, 0, bool(compl))
         if compl:
             current = self.read_current()
             voltage = self.read_voltage()
@@ -321,12 +339,15 @@ class Keithley2657(Keithley):
             msg += '\x1B[u\x1B[1D'
             print(msg, end=' ')
             sys.stdout.flush()
-        return {'current': current, 'voltage': voltage, 'compliance': compl}
+        return [{'current': current, 'voltage': voltage, 'compliance': compl}]  # one entry per channel like the other devices
 
     def set_output(self, status, channel=None):
         self.__write('smua.source.output = %d' % status)
         return self.get_output()
 
+    def write_emergency_off(self):
+        self.inst.write('smua.source.output = 0')
+
     def get_output(self):
         retVal = self.print_bool('smua.source.output')
         return retVal
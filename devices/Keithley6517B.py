@@ -18,21 +18,20 @@ class Keithley6517B(Keithley):
             sleep(0.2)
         else:
             sleep(0.2)
-            self.set_output(False)
-            self.reset()
-            self.clear_buffer()
-            self.identify()
-            self.set_max_voltage()
-            self.set_zero_check(False)
-            self.set_standard_output_format(':FORM:ELEM VSO,READ')
-            self.set_filter_type('ADV')
-            self.set_average_filter(True)
-            self.set_filter_count(3)
-            self.set_measurement_speed(5)
+            with self.batch():
+                self.set_output(False)
+                self.reset()
+                self.clear_buffer()
+                self.identify()
+                self.set_max_voltage()
+                self.set_zero_check(False)
+                self.set_standard_output_format(':FORM:ELEM VSO,READ')
+                self.set_filter_type('ADV')
+                self.set_average_filter(True)
+                self.set_filter_count(3)
+                self.set_measurement_speed(5)
+                self.config_readout()
             self.clear_error_queue()
-            sleep(0.2)
-            self.config_readout()
-            sleep(0.2)
 
     # ============================
     # DEVICE FUNCTIONS
@@ -88,16 +87,16 @@ class Keithley6517B(Keithley):
 
     # ============================
     # GET-FUNCTIONS
-    def get_voltage_range(self):
-        return int(self.get_answer_for_query(':SOUR:VOLT:RANG?'))
+    def get_voltage_range(self, refresh=False):
+        return int(self.query_setting(':SOUR:VOLT:RANG?', refresh))
 
-    def get_filter_type(self):
+    def get_filter_type(self, refresh=False):
         data = ':SENS:' + self.measure_value + ':DC:AVER:TYPE?'
-        return self.get_answer_for_query(data)
+        return self.query_setting(data, refresh)
 
-    def get_filter_count(self):
+    def get_filter_count(self, refresh=False):
         data = ':SENS:' + self.measure_value + ':DC:AVER:COUN?'
-        return self.get_answer_for_query(data)
+        return self.query_setting(data, refresh)
 
 
 if __name__ == '__main__':
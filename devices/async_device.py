@@ -0,0 +1,129 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       asyncio interface to drive all HV devices concurrently from one event loop
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread
+from time import monotonic
+from src.utils import info, warning, choose
+
+
+class AsyncDevice(object):
+    """ Async flavour of the device API. The blocking driver calls of each device run in a dedicated executor thread,
+        so the I/O of one device stays serialised while a slow device does not delay the others. """
+
+    def __init__(self, device, timeout=None):
+        self.Device = device
+        self.Executor, self.RampExecutor = self.create_executors()
+        self.Timeout = choose(timeout, device.Config.get_value('async timeout', float, default=10))
+        self.NTimeouts = 0
+
+    def create_executors(self):
+        section = self.Device.Config.Section
+        return ThreadPoolExecutor(1, thread_name_prefix='Async{}'.format(section)), ThreadPoolExecutor(1, thread_name_prefix='AsyncRamp{}'.format(section))
+
+    def restart(self):
+        """ Reconnect the device and replace the executors, whose threads may be stuck in a blocking call. """
+        self.Device.reset_io()
+        self.Device.NRestarts += 1
+        old = [self.Executor, self.RampExecutor]
+        self.Executor, self.RampExecutor = self.create_executors()
+        for executor in old:
+            executor.shutdown(wait=False)
+
+    async def call(self, func, *args, executor=None):
+        loop = asyncio.get_event_loop()
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(self.Executor if executor is None else executor, func, *args), self.Timeout)
+        except asyncio.TimeoutError:
+            self.NTimeouts += 1
+            raise
+
+    async def read_iv(self):
+        return await self.call(self.Device.read_iv)
+
+    async def set_bias(self, voltage, channel=0):
+        return await self.call(self.Device.set_bias, voltage, channel)
+
+    async def get_output_status(self, channel=0):
+        return await self.call(self.Device.get_output_status, channel)
+
+    async def set_output(self, status, channel=0):
+        return await self.call(self.Device.set_output, status, channel)
+
+    async def poll(self):
+        return await self.call(self.Device.poll)
+
+    async def step_ramp(self):
+        """The ramp runs in its own executor so that it does not queue behind the readout. Both share the device lock."""
+        return await self.call(self.Device.step_ramp, executor=self.RampExecutor)
+
+
+class AsyncEngine(object):
+    """ Runs the main loops of all devices as coroutines of a single event loop.
+        Use run() for headless operation or start() to run the loop in a background thread next to the Qt GUI. """
+
+    def __init__(self, devices=None):
+        self.Devices = [AsyncDevice(device) for device in choose(devices, [])]
+        self.Loop = None
+        self.Thread = None
+
+    def add_device(self, device):
+        self.Devices.append(AsyncDevice(device))
+        return self.Devices[-1]
+
+    def restart_device(self, device):
+        next(d for d in self.Devices if d.Device is device).restart()
+
+    async def drive(self, device, func, ticker, period):
+        ticker.reset()
+        wakeup = asyncio.Event()
+        ticker.OnWake = lambda: self.Loop.call_soon_threadsafe(wakeup.set)
+        while not device.Device.IsKilled:
+            try:
+                await asyncio.wait_for(wakeup.wait(), max(0, ticker.next(period()) - monotonic()))
+                ticker.skip_to_now()
+            except asyncio.TimeoutError:
+                pass
+            wakeup.clear()
+            ticker.Wakeup.clear()
+            try:
+                await func()
+            except asyncio.TimeoutError:
+                warning('{} did not respond within {} s'.format(device.Device.Config.Section, device.Timeout))
+            except Exception as err:
+                if not device.Device.IsKilled:  # the executors are shut down on stop
+                    warning('Error in async loop of {}: {}'.format(device.Device.Config.Section, err))
+
+    def make_loops(self, device):
+        dev = device.Device
+        dev.Heartbeat = monotonic()
+        loops = [self.drive(device, device.poll, dev.Ticker, dev.get_period)]
+        return loops + ([self.drive(device, device.step_ramp, dev.RampTicker, lambda: dev.RampPeriod)] if not dev.FromLogs else [])
+
+    async def main(self):
+        info('starting async engine for {} devices'.format(len(self.Devices)))
+        await asyncio.gather(*[loop for device in self.Devices for loop in self.make_loops(device)])
+
+    def run(self):
+        """Blocks until all devices are killed."""
+        self.Loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.Loop)
+        try:
+            self.Loop.run_until_complete(self.main())
+        finally:
+            self.Loop.close()
+
+    def start(self):
+        self.Thread = Thread(target=self.run, daemon=True)
+        self.Thread.start()
+
+    def stop(self):
+        for device in self.Devices:
+            device.Device.IsKilled = True
+            device.Executor.shutdown(wait=False)
+            device.RampExecutor.shutdown(wait=False)
+        info('stopped async engine')
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Cache for the answers of device queries
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from concurrent.futures import Future
+from functools import wraps
+from threading import Lock
+from time import monotonic
+
+
+class CacheEntry(object):
+
+    def __init__(self):
+        self.Future = Future()
+        self.Time = None  # end of the transaction
+
+
+class QueryCache(object):
+    """ Keeps the answer of every query for its time to live. If an expired query is requested by several threads at once,
+        only the first one talks to the device and the others wait for its answer. Hits return the very same object, so
+        callers can tell a repeated answer from a new one by identity. """
+
+    def __init__(self):
+        self.Entries = {}
+        self.Lock = Lock()
+        self.Stats = {}
+
+    def get(self, name, func, ttl, *args):
+        """ :returns: the cached answer of query [name] with arguments [args] or the result of func(*args) if it is older than [ttl] seconds. """
+        key = (name, args)
+        with self.Lock:
+            stats = self.Stats.setdefault(name, {'hits': 0, 'misses': 0, 'coalesced': 0})
+            entry = self.Entries.get(key)
+            if entry is not None and not entry.Future.done():
+                stats['coalesced'] += 1
+                owner = False
+            elif entry is not None and monotonic() - entry.Time < ttl:
+                stats['hits'] += 1
+                owner = False
+            else:
+                stats['misses'] += 1
+                entry = self.Entries[key] = CacheEntry()
+                owner = True
+        if owner:
+            try:
+                result = func(*args)
+                entry.Time = monotonic()
+                entry.Future.set_result(result)
+            except Exception as err:
+                with self.Lock:
+                    if self.Entries.get(key) is entry:
+                        del self.Entries[key]
+                entry.Future.set_exception(err)
+        return entry.Future.result()
+
+    def peek(self, name, *args, default=None):
+        """ :returns: the last answer of the query regardless of its age without talking to the device. """
+        entry = self.Entries.get((name, args))
+        return entry.Future.result() if entry is not None and entry.Future.done() and entry.Future.exception() is None else default
+
+    def invalidate(self, name=None):
+        """ Forget the answers of query [name] (all if None). Answers of queries still in flight are not kept either, since they may be outdated. """
+        with self.Lock:
+            for key in [key for key in self.Entries if name is None or key[0] == name]:
+                del self.Entries[key]
+
+    def get_stats(self):
+        """ :returns: number of hits, misses and coalesced calls per query. """
+        with self.Lock:
+            return {name: dict(stats) for name, stats in self.Stats.items()}
+
+
+def cached(func):
+    """ Decorator for the queries of a device. The answer is cached for the time to live set in the CacheTTL of the device class. """
+    @wraps(func)
+    def wrapper(self, *args):
+        ttl = self.CacheTTL.get(func.__name__, 0)
+        return self.Cache.get(func.__name__, lambda *a: func(self, *a), ttl, *args) if ttl > 0 else func(self, *args)
+    return wrapper
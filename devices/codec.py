@@ -0,0 +1,35 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Conversion between command strings and the bytes on the wire
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from functools import lru_cache
+from numpy import fromstring
+
+Garbage = b'\r\n\x00\x13\x11\x10'  # line terminators and flow control characters
+
+
+@lru_cache(maxsize=256)
+def encode(command, end='\r\n'):
+    """ :returns: the bytes of [command] with the line terminator [end]. Every distinct command is only encoded once. """
+    return (command + end).encode('ascii')
+
+
+def decode(data):
+    return bytes(data).decode('ascii', errors='replace')
+
+
+def clean(data):
+    """ :returns: the bytes of [data] without line terminators and flow control characters. """
+    return bytes(data).translate(None, Garbage)
+
+
+def parse_floats(data, units=b'', sep=b','):
+    """ Parse a separated answer directly from bytes into an array of floats.
+        :param units: characters to strip from the values, e.g. b'AV' for answers like b'1.2E-6A,3.0E1V'. """
+    data = clean(data).translate(None, units)
+    values = fromstring(data, sep=sep.decode())
+    if values.size != data.count(sep) + 1:
+        raise ValueError('could not convert "{}" to floats'.format(decode(data)))
+    return values
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Command queue to execute requests from the GUI in the acquisition loop of a device
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from concurrent.futures import Future
+from queue import Queue, Empty
+from time import monotonic
+from src.utils import warning
+
+
+class CommandQueue(object):
+    """ Commands are submitted from any thread and executed by the acquisition loop between two polls. """
+
+    def __init__(self):
+        self.Queue = Queue()
+
+        # Statistics
+        self.NExecuted = 0
+        self.TotalLatency = 0.
+        self.MaxLatency = 0.
+        self.LastLatency = 0.
+
+    def submit(self, func, *args, callback=None):
+        """ :returns: future which holds the return value of [func] after execution. [callback] is called with the future from the device thread. """
+        future = Future()
+        if callback is not None:
+            future.add_done_callback(callback)
+        self.Queue.put((func, args, future, monotonic()))
+        return future
+
+    def execute(self):
+        """ Run all pending commands in the calling thread. """
+        while True:
+            try:
+                func, args, future, t = self.Queue.get_nowait()
+            except Empty:
+                return
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args)
+            except Exception as err:
+                warning('Command {} failed: {}'.format(getattr(func, '__name__', func), err))  # most callers never read the future
+                self.add_latency(monotonic() - t)
+                future.set_exception(err)
+                continue
+            self.add_latency(monotonic() - t)
+            future.set_result(result)
+
+    def add_latency(self, t):
+        self.NExecuted += 1
+        self.TotalLatency += t
+        self.MaxLatency = max(self.MaxLatency, t)
+        self.LastLatency = t
+
+    def get_depth(self):
+        return self.Queue.qsize()
+
+    def get_mean_latency(self):
+        return self.TotalLatency / self.NExecuted if self.NExecuted else 0.
+
+    def get_stats(self):
+        return {'depth': self.get_depth(), 'executed': self.NExecuted, 'last latency': self.LastLatency, 'mean latency': self.get_mean_latency(), 'max latency': self.MaxLatency}
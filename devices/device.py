@@ -1,19 +1,29 @@
 from glob import glob
-from math import copysign
 from os.path import join
-from threading import Thread
-from time import sleep
+from threading import Thread, Condition
+from time import sleep, monotonic
 from os import SEEK_END
 
 from src.logger import Logger
 from src.utils import *
 from src.config import Config
-from numpy import sign
+from devices.lock import FairLock
+from devices.commands import CommandQueue
+from devices.timing import Ticker, ClockSync
+from devices.reading import Reading
+from devices.history import History
+from devices.transient import TransientRecorder
+from devices.cache import QueryCache
+from devices.events import EventBus
+from numpy import sign, full, nan, minimum, where, isnan
 
 __author__ = 'Michael Reichmann'
 
 
 class Device(Thread):
+
+    CacheTTL = {}  # time to live in seconds of the queries decorated with @cached, set by the drivers
+
     def __init__(self, device_num, config='main', hot_start=True, print_logs=False, init_logger=True, start_time='now'):
         Thread.__init__(self)
 
@@ -32,6 +42,10 @@ class Device(Thread):
         self.BiasNow = zeros(self.NChannels)
         self.CurrentNow = zeros(self.NChannels)
         self.Status = zeros(self.NChannels, bool)
+        self.Readings = [Reading() for _ in range(self.NChannels)]  # latest immutable sample of each channel
+        self.LastIV = None  # last answer of read_iv
+        self.NewReading = Condition()
+        self.History = [History(self.Config.get_value('history size', int, default=36000)) for _ in range(self.NChannels)]
 
         # Channel Config Data
         self.RampSpeed = self.Config.get_channel_values('ramping speed')
@@ -44,16 +58,62 @@ class Device(Thread):
 
         # Status
         self.IsKilled = False
-        self.IsBusy = False
         self.IsManual = False
         self.IsPoweringDown = zeros(self.NChannels, bool)
         self.MaxWaitingTime = 20    # seconds
+        self.Lock = FairLock(self.Config.Section, self.MaxWaitingTime)  # guards all I/O with the device
+        self.Commands = CommandQueue()
+        self.Cache = QueryCache()
 
-        self.LastVChange = time()
+        # Watchdog
+        self.Heartbeat = monotonic()  # time of the last successful transaction with the device
+        self.StallDeadline = self.Config.get_value('stall deadline', float, default=30)
+        self.Generation = 0  # incremented on every restart, outdated worker loops exit when they wake up
+        self.NRestarts = 0
+
+        self.LastVChange = monotonic()
         self.LastUpdate = time()
         self.CanRamp = False  # set in inheriting classes if ramping is available
 
+        # Scheduling
+        self.Period = self.Config.get_value('update period', float, default=.1)
+        self.Priority = self.Config.get_value('priority', int, default=0)
+        self.Ticker = Ticker(self.Period)
+        self.Clock = ClockSync()  # maps instrument timestamps onto the host clock
+
+        # Adaptive sampling: poll with the fast period while ramping or while the current changes, otherwise with the slow one
+        self.FastPeriod = self.Config.get_value('fast period', float, default=self.Period)
+        self.SlowPeriod = self.Config.get_value('slow period', float, default=self.Period)
+        self.CurrentThreshold = self.Config.get_value('current threshold', float, default=1e-9)
+        self.SettleTime = self.Config.get_value('settle time', float, default=10)
+        self.LastActivity = monotonic()
+
+        # Ramp control loop
+        self.RampPeriod = self.Config.get_value('ramp period', float, default=self.Period)
+        self.RampPriority = self.Config.get_value('ramp priority', int, default=self.Priority)
+        self.RampTicker = Ticker(self.RampPeriod)
+
+        # Setpoint cache: only write the bias if it changed, optionally reassert it every 'reassert period' seconds
+        self.SetPoints = full(self.NChannels, nan)
+        self.LastSetPointWrite = zeros(self.NChannels)
+        self.ReassertPeriod = self.Config.get_value('reassert period', float, default=0)
+        self.NSetPointWrites = 0
+        self.NSavedWrites = 0
+
+        # Completion sync: wait for the instrument to confirm a command instead of sleeping a fixed time after it
+        self.CompletionSync = self.Config.get_value('completion sync', bool, default=False)
+        self.NSynced = 0
+        self.SavedIdleTime = 0.
+
         self.Logger = self.init_logger(init_logger)
+        self.LogPeriod = self.Config.get_value('log period', float, default=0)  # the history and the transients keep every reading
+        self.LastLogTime = zeros(self.NChannels)
+        self.LoggedSeq = zeros(self.NChannels, int)
+        self.LoggedStatus = full(self.NChannels, nan)
+        self.Transients = self.init_transient_recorders()
+        self.Events = EventBus()  # trips, compliance, ... pushed by the drivers
+        self.Conditions = {}  # current state of every (event type, channel)
+        self.Events.subscribe(self.log_event)
         self.FromLogs = False
         self.StartTime = self.load_start_time(start_time)
 
@@ -61,37 +121,103 @@ class Device(Thread):
 
     def run(self):
         """Main loop for the thread."""
-        while not self.IsKilled:
-            sleep(.5 if self.FromLogs else .1)
+        self.run_loop(self.Generation)
+
+    def run_loop(self, generation):
+        if not self.FromLogs:
+            Thread(target=self.run_ramp, args=(generation,), daemon=True).start()
+        self.Ticker.reset()
+        self.Heartbeat = monotonic()
+        while not self.IsKilled and generation == self.Generation:
+            self.Ticker.wait(self.get_period())
+            self.poll()
+
+    def run_ramp(self, generation=0):
+        """Ramp control loop, runs next to the main loop with its own period."""
+        self.RampTicker.reset()
+        while not self.IsKilled and generation == self.Generation:
+            self.RampTicker.wait()
+            self.step_ramp()
+
+    def poll(self):
+        """Single iteration of the main loop, called either by the thread or by the scheduler."""
+        self.Commands.execute()
+        if not self.IsManual and not self.FromLogs:
+            if self.update_voltage_current():
+                self.Heartbeat = monotonic()  # only completed transactions count, a hung port has to stall the device
+            self.write_logs()
+        else:
             if not self.IsManual:
-                if not self.FromLogs:
-                    self.update_voltage_current()
-                    self.write_logs()
-                    self.ramp()
-                else:
-                    self.update()
+                self.update()
+            self.Heartbeat = monotonic()
+
+    def step_ramp(self):
+        """Single iteration of the ramp control loop, called either by the ramp thread or by the scheduler."""
+        if not self.IsManual and not self.FromLogs:
+            try:
+                self.ramp()
+            except Exception as err:
+                warning('Could not ramp {}: {}'.format(self.Config.Section, err))
 
     def stop(self):
         self.IsKilled = True
         critical('exiting')
 
+    def get_heartbeat_age(self):
+        return monotonic() - self.Heartbeat
+
+    def reset_io(self):
+        """ Drop the lock, which may still be held by the stalled thread, and reopen the connection to the device.
+            The setpoints are written again afterwards since the state of the device is unknown. """
+        self.Lock = FairLock(self.Config.Section, self.MaxWaitingTime)
+        self.clear_setpoints()
+        try:
+            self.connect()
+        except Exception as err:
+            warning('Could not reconnect {}: {}'.format(self.Config.Section, err))
+
+    def restart(self):
+        """ Abandon the stalled worker threads and start new ones. The old threads exit as soon as their I/O returns. """
+        self.reset_io()
+        self.Generation += 1
+        self.NRestarts += 1
+        Thread(target=self.run_loop, args=(self.Generation,), daemon=True).start()
+
+    def submit(self, func, *args, callback=None):
+        """ Queue [func] to be executed in the acquisition loop, which is woken up to run it right away. :returns: future of the result. """
+        future = self.Commands.submit(func, *args, callback=callback)
+        self.Ticker.wake()
+        return future
+
     def write_logs(self):
+        """ Log every new reading (at most one per 'log period') and changes of the output status. """
         for channel in self.ActiveChannels:
-            self.Logger[channel].write_log(self.get_status(channel), self.get_bias(channel), self.get_current(channel), self.is_ramping(channel), self.get_target_bias(channel), prnt=self.PrintLogs)
+            status = self.get_status(channel)
+            r = self.get_new_reading(channel, self.LoggedSeq[channel])
+            if r is None or r.Time - self.LastLogTime[channel] < self.LogPeriod:
+                if status == self.LoggedStatus[channel]:
+                    continue
+                r, t = self.get_reading(channel), None  # status change without a new sample, logged with the current time
+            else:
+                self.LoggedSeq[channel] = r.Seq
+                self.LastLogTime[channel] = t = r.Time
+            self.LoggedStatus[channel] = status
+            self.Logger[channel].write_log(status, r.Voltage, r.Current, self.is_ramping(channel), self.get_target_bias(channel), prnt=self.PrintLogs, t=t)
 
     def connect(self):
         warning('"connect" not implemented')
 
     def hot_start(self):
+        """ Take over the measured biases of all channels from one status and one IV snapshot of the whole device. """
         if self.HotStart:
-            for channel in self.ActiveChannels:
-                self.set_status(channel, self.get_output_status(channel))
-                self.update_voltage_current()
-                voltage = self.get_bias(channel)
-                info('Measured voltage: {0:2.1f} V'.format(voltage))
-                self.set_bias(voltage, channel)
+            self.update_voltage_current()
+            channels = array(self.ActiveChannels)
+            voltages = self.BiasNow[channels]
+            for channel, voltage in zip(channels, voltages):
+                info('Measured voltage: {0:2.1f} V{1}'.format(voltage, ' (CH{})'.format(channel) if self.NChannels > 1 else ''))
+            self.write_setpoints(voltages, channels)
+            for channel, voltage in zip(channels, voltages):
                 self.set_target_bias(voltage, channel)
-                self.BiasNow[channel] = voltage
 
     def update(self):
         data = self.get_last_data()
@@ -101,15 +227,40 @@ class Device(Thread):
             if data[channel][0]:
                 self.LastUpdate = data[channel][0]
 
+    def check_events(self):
+        """ Poll the event registers of the device. Drivers which detect events from the status of the readings use set_condition instead. """
+        pass
+
+    def set_condition(self, event_type, channel, active, info=''):
+        """ Publish an event of [event_type] if the condition of the channel changed. :returns: whether the condition is active. """
+        active = bool(active)
+        if self.Conditions.get((event_type, channel), False) != active:
+            self.Conditions[(event_type, channel)] = active
+            self.Events.publish(event_type(self.Config.Section, channel, active, info))
+        return active
+
+    def log_event(self, event):
+        if event.Active:
+            warning(str(event))
+        self.Logger[event.Channel].add_entry('{}{}{}'.format(event.Name, '' if event.Active else '_CLEARED', ' {}'.format(event.Info) if event.Info else ''), t=event.Time)
+
     def update_status(self):
-        for channel in self.ActiveChannels:
-            self.set_status(channel, self.get_output_status(channel))
+        for channel, status in zip(self.ActiveChannels, self.get_output_statuses(self.ActiveChannels)):
+            self.set_status(channel, status)
 
     # -----------------------------------
     # region INIT
     def init_logger(self, init=True):
         return [Logger(channel, self.Config, on=channel in self.ActiveChannels if init else False) for channel in range(self.NChannels)]
 
+    def init_transient_recorders(self):
+        """ :returns: a transient recorder for every channel with a current threshold or a dI/dt trigger set in the config, otherwise None. """
+        didt, threshold = self.Config.get_channel_values('transient didt', default=0), self.Config.get_channel_values('transient threshold', default=0)
+        pre, post = self.Config.get_value('transient pre', float, default=10), self.Config.get_value('transient post', float, default=10)
+        directory = join(self.Logger[0].LoggingDir, 'transients')
+        return [TransientRecorder(self.History[ch], directory, '{}_CH{}'.format(self.Logger[ch].DeviceName, ch), didt[ch], threshold[ch], pre, post) if didt[ch] or threshold[ch] else None
+                for ch in range(self.NChannels)]
+
     @staticmethod
     def load_start_time(start_time):
         if start_time == 'now':
@@ -150,6 +301,10 @@ class Device(Thread):
     def get_output_status(self, channel=0):
         warning('get_output_status not implemented')
 
+    def get_output_statuses(self, channels=None):
+        """ :returns: list with the output status of the [channels] (default: active channels). Drivers which can query all channels at once should override this. """
+        return [self.get_output_status(channel) for channel in choose(channels, self.ActiveChannels)]
+
     def get_output(self):
         return self.get_status()
 
@@ -165,6 +320,14 @@ class Device(Thread):
     def get_update_time(self):
         return self.LastUpdate
 
+    def get_period(self):
+        if self.FromLogs:
+            return .5
+        return self.FastPeriod if self.is_active() else self.SlowPeriod
+
+    def is_active(self):
+        return monotonic() - self.LastActivity < self.SettleTime or any(self.is_ramping(channel) for channel in self.ActiveChannels)
+
     def get_data_from_logs(self, channel=0):
         files = sorted(glob(join(self.Logger[channel].LogFileDir, '*')))
         if not files:
@@ -222,11 +385,18 @@ class Device(Thread):
     def set_bias(self, voltage, channel=0):
         warning('set_bias not implemented')
 
+    def set_biases(self, voltages, channels):
+        """ Set the biases of several channels. Drivers which accept channel lists should override this with a batched write. """
+        for voltage, channel in zip(voltages, channels):
+            self.set_bias(voltage, channel)
+
     def set_target_bias(self, target, channel):
         if not self.validate_voltage(target, channel):
             return
         self.TargetBias[channel] = target
-        self.LastVChange = time()
+        self.LastVChange = monotonic()
+        self.LastActivity = self.LastVChange
+        self.RampTicker.wake()  # do not wait for the rest of a long period to start the ramp
         info('Set target bias to {}'.format(target))
         self.Logger[channel].add_entry('SET_BIAS_TO {0:7.1f}'.format(target))
 
@@ -236,6 +406,26 @@ class Device(Thread):
     def set_output(self, status, channel=0):
         warning('set_output not implemented')
 
+    def emergency_off(self, timeout=.5):
+        """ Switch off all outputs as fast as possible, bypassing the command queue. The lock is only awaited for [timeout]
+            seconds, so that a stalled readout cannot delay the shutdown. :returns: the latency in seconds. """
+        t = monotonic()
+        locked = self.Lock.acquire(timeout)
+        try:
+            self.TargetBias[:] = 0  # do not jump back to the old bias if the output is switched on again
+            self.IsPoweringDown[:] = False
+            self.clear_setpoints()
+            self.write_emergency_off()
+        finally:
+            if locked:
+                self.Lock.release()
+        return monotonic() - t
+
+    def write_emergency_off(self):
+        """ Sends the kill command to the device. Drivers should override this with a single write not taking the lock. """
+        for channel in self.ActiveChannels:
+            self.set_output(OFF, channel)
+
     def set_ramp_speed(self, speed, channel=0):
         info('Set ramp speed to {}'.format(speed))
         self.RampSpeed[channel] = speed
@@ -269,38 +459,83 @@ class Device(Thread):
         self.set_target_bias(0, channel)
         self.IsPoweringDown[channel] = True
 
-    def wait_for_device(self):
-        now = time()
-        while time() - now < self.MaxWaitingTime and self.IsBusy:
-            sleep(.2)
-
     def read_iv(self):
         warning('read_iv not implemented')
         return []
 
     def update_voltage_current(self):
-        self.wait_for_device()
-        self.IsBusy = True
+        """ :returns: whether the status and, if an output is on, the currents and voltages were read successfully. """
+        lock = self.Lock  # keep the reference, the watchdog may replace the lock while we are stuck
+        if not lock.acquire():
+            warning('Could not update voltage/current - {} is busy for more than {} s'.format(self.Config.Section, self.MaxWaitingTime))
+            return False
         try:
             self.update_status()
         except Exception as inst:
             warning('Could not update voltage/current- get output status: {} {}'.format(inst, inst.args))
-            self.IsBusy = False
-            return
+            lock.release()
+            return False
+        try:
+            self.check_events()
+        except Exception as err:
+            warning('Could not check the events of {}: {}'.format(self.Config.Section, err))
+        success = True
         status = any(self.Status)
         if status:
             try:
                 iv = self.read_iv()
-                self.fill_iv_now(iv)
-                self.LastUpdate = time()
+                if iv is not self.LastIV:  # a cached answer is the same object, only publish new samples
+                    self.LastIV = iv
+                    self.fill_iv_now(iv, time())
+                    self.LastUpdate = time()
             except Exception as inst:
                 warning('Could not read valid iv {} {}'.format(type(inst), inst))
-        self.IsBusy = False
+                success = False
+        lock.release()
+        return success
 
-    def fill_iv_now(self, data):
+    def fill_iv_now(self, data, t=None):
+        t = self.get_sample_time(data, t)
         for channel in self.ActiveChannels:
+            if abs(data[channel]['current'] - self.CurrentNow[channel]) > self.CurrentThreshold:
+                self.LastActivity = monotonic()
             self.BiasNow[channel] = data[channel]['voltage']
             self.CurrentNow[channel] = data[channel]['current']
+            self.publish(channel, data[channel]['voltage'], data[channel]['current'], t)
+
+    def get_sample_time(self, data, t=None):
+        """ :returns: the time of the measurement on the host clock if the device supplies a timestamp, otherwise the time [t] when it was received. """
+        t = time() if t is None else t
+        t_device = data[0].get('time') if len(data) else None
+        return t if t_device is None else self.Clock.add(t_device, t)
+
+    def publish(self, channel, voltage, current, t=None):
+        """ Replace the reading of the channel by a new record, so readers always see a consistent sample. """
+        with self.NewReading:
+            self.Readings[channel] = r = Reading(time() if t is None else t, voltage, current, self.Status[channel], self.Readings[channel].Seq + 1)
+            self.History[channel].add(r.Time, r.Voltage, r.Current, r.Status)
+            self.NewReading.notify_all()
+        if self.Transients[channel] is not None:
+            file_name = self.Transients[channel].add(r.Time, r.Current)
+            if file_name is not None:
+                self.Logger[channel].add_entry('TRANSIENT_CAPTURED {}'.format(basename(file_name)))
+
+    def get_reading(self, channel=0):
+        return self.Readings[channel]
+
+    def get_history(self, t0=None, t1=None, channel=0):
+        """ :returns: view of the stored readings between the timestamps [t0] and [t1] with the fields time, voltage, current and status. """
+        return self.History[channel].get_range(t0, t1)
+
+    def get_new_reading(self, channel=0, seq=0):
+        """ :returns: the latest reading if it is newer than [seq], otherwise None. """
+        reading = self.Readings[channel]
+        return reading if reading.Seq > seq else None
+
+    def wait_for_reading(self, channel=0, seq=0, timeout=None):
+        """ Block until there is a reading newer than [seq]. :returns: the reading or None after the timeout. """
+        with self.NewReading:
+            return self.Readings[channel] if self.NewReading.wait_for(lambda: self.Readings[channel].Seq > seq, timeout) else None
 
     def get_bias_now(self, channel=0):
         return self.BiasNow[channel]
@@ -313,10 +548,58 @@ class Device(Thread):
 
     def calc_ramp_bias(self, channel=0):
         """ Calculate the next step of the voltage if there is no inherit ramping method. """
-        delta_v = self.get_target_bias(channel) - self.get_bias(channel)
-        step_size = copysign(abs(self.RampSpeed[channel] * (time() - self.LastVChange)), delta_v)  # get the voltage step by multiplying speed and update interval
-        step_size = self.MaxStep[channel] if abs(step_size) > self.MaxStep[channel] else step_size
-        return self.get_target_bias(channel) if abs(delta_v) <= abs(step_size) else self.get_bias(channel) + step_size
+        return self.calc_ramp_biases([channel])[0]
+
+    def calc_ramp_biases(self, channels):
+        """ Calculate the next voltage step of all given channels at once. The steps continue from the last written setpoint,
+            so the ramp keeps its speed if the readout is slower than the ramp loop. The measured bias is only used to start
+            and the setpoint may not run ahead of it by more than the max step. """
+        channels = array(channels)
+        target, measured, setpoint = self.TargetBias[channels], self.BiasNow[channels], self.SetPoints[channels]
+        bias = where(isnan(setpoint), measured, setpoint)
+        delta_v = target - bias
+        step_size = minimum(abs(self.RampSpeed[channels] * (monotonic() - self.LastVChange)), self.MaxStep[channels])  # speed times update interval, limited by the max step
+        step_size = where(abs(bias - measured) < self.MaxStep[channels], step_size, 0)  # wait for the device to follow
+        return where(abs(delta_v) <= step_size, target, bias + sign(delta_v) * step_size)
+
+    def write_setpoint(self, voltage, channel=0):
+        """ Set the bias only if it differs from the last written value or if the reassert period has passed. :returns: whether it was written. """
+        return self.write_setpoints([voltage], [channel]) > 0
+
+    def write_setpoints(self, voltages, channels):
+        """ Write the biases of all given channels in one batch, skipping the ones which did not change. :returns: number of written channels. """
+        voltages, channels, now = array(voltages, dtype=float), array(channels), monotonic()
+        write = (voltages != self.SetPoints[channels]) | (self.ReassertPeriod > 0) & (now - self.LastSetPointWrite[channels] > self.ReassertPeriod)
+        self.NSavedWrites += int((~write).sum())
+        if write.any():
+            self.set_biases(voltages[write], channels[write])
+            self.SetPoints[channels[write]] = voltages[write]
+            self.LastSetPointWrite[channels[write]] = now
+            self.NSetPointWrites += int(write.sum())
+        return int(write.sum())
+
+    def clear_setpoints(self):
+        """ Forget the cached setpoints, e.g. after the device was reset. """
+        self.SetPoints[:] = nan
+
+    def get_setpoint_stats(self):
+        return {'written': self.NSetPointWrites, 'saved': self.NSavedWrites}
+
+    def get_cache_stats(self):
+        return self.Cache.get_stats()
+
+    def sync(self, confirm, sleep_time):
+        """ Wait until confirm() reports the completion of the last command if 'completion sync' is enabled.
+            Sleep for the rest of [sleep_time] if it is disabled or the instrument could not confirm. """
+        t = monotonic()
+        if self.CompletionSync and confirm():
+            self.NSynced += 1
+            self.SavedIdleTime += sleep_time - (monotonic() - t)  # negative if the fixed sleep was too short
+        else:
+            sleep(max(0, sleep_time - (monotonic() - t)))
+
+    def get_sync_stats(self):
+        return {'enabled': self.CompletionSync, 'synced': self.NSynced, 'saved idle time': self.SavedIdleTime}
 
     def ramp(self):
         """ Try slowly ramp up the voltage by iteratively increasing the set voltage (if the device has not inherent ramping method) """
@@ -327,20 +610,20 @@ class Device(Thread):
                 self.IsPoweringDown[channel] = False
                 info('CH{ch} of {dev} has ramped down and turned off'.format(ch=channel, dev=self.Config.Section))
                 return
+        channels = array(self.ActiveChannels)
         if self.CanRamp:
-            for channel in self.ActiveChannels:
-                self.set_bias(self.get_target_bias(channel), channel)
+            self.write_setpoints(self.TargetBias[channels], channels)
             return
 
-        for channel in self.ActiveChannels:
-            if self.is_ramping(channel):
-                self.IsBusy = True
-                new_bias = self.calc_ramp_bias(channel)
-                self.set_bias(new_bias, channel)
-                self.LastVChange = time()
-                if new_bias == self.get_target_bias(channel) and not self.IsPoweringDown[channel]:
-                    info('{} is done with ramping to {} V'.format(self.Config.Section, self.get_target_bias()))
-                self.IsBusy = False
+        channels = channels[[self.is_ramping(channel) for channel in channels]]
+        if channels.size:
+            with self.Lock:
+                old_biases = self.SetPoints[channels].copy()
+                new_biases = self.calc_ramp_biases(channels)
+                self.write_setpoints(new_biases, channels)
+                self.LastVChange = monotonic()
+            for channel in channels[(new_biases == self.TargetBias[channels]) & (old_biases != new_biases) & ~self.IsPoweringDown[channels]]:
+                info('{} is done with ramping to {} V'.format(self.Config.Section, self.get_target_bias(channel)))
     # endregion MISCELLANEOUS
     # -----------------------------------
 
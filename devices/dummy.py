@@ -8,11 +8,13 @@ from copy import deepcopy
 from numpy import ones
 from numpy.random import rand, normal, randint
 from devices.device import *
+from devices.cache import cached
 
 
 class Dummy(Device):
 
     N = 0
+    CacheTTL = {'read_iv': .5}
 
     def __init__(self, device_no, config='main', hot_start=True, init_logger=False):
 
@@ -21,12 +23,7 @@ class Dummy(Device):
         self.Model = self.get_model_name()
 
         # Info
-        self.Busy = False
         self.last_write = ''
-        self.LastMeasurement = -1
-        self.LastCurrents = []
-        self.LastVoltages = []
-        self.LastStatusUpdate = -1
         self.LastStatus = ['On' if hot_start else 'Off'] * self.NChannels
         self.lastVoltage = 0
         self.CanRamp = False
@@ -34,6 +31,7 @@ class Dummy(Device):
 
         self.BiasNow = array([0 if ch not in self.ActiveChannels else round_down_to(self.MaxBias[ch] * rand() * [-1, 1][randint(0, 1)], 10) for ch in range(self.NChannels)])
         self.TargetBias = deepcopy(self.BiasNow)
+        self.Voltage = deepcopy(self.BiasNow)  # output of the simulated instrument, BiasNow only holds what was measured
         self.SeedCurrent = randint(10, 80, self.NChannels) * 1e-9
         self.hot_start()
 
@@ -42,8 +40,11 @@ class Dummy(Device):
     def set_output(self, status, channel=None):
         self.Output[channel] = status
 
+    def write_emergency_off(self):
+        self.Output[:] = False
+
     def set_bias(self, voltage, channel=None):
-        self.BiasNow[channel] = voltage
+        self.Voltage[channel] = voltage
 
     def set_current(self, current, channel):
         self.CurrentNow[channel] = current
@@ -52,16 +53,12 @@ class Dummy(Device):
         return normal(self.SeedCurrent, 5e-9)
 
     def read_voltage(self):
-        return self.BiasNow
+        return self.Voltage.copy()
 
+    @cached
     def read_iv(self):
-        now = time()
         sleep(1)
-        if now - self.LastMeasurement > .5:
-            self.LastCurrents = self.read_current()
-            self.LastVoltages = self.read_voltage()
-            self.LastMeasurement = now
-        return [{'voltage': v, 'current': c} for v, c in zip(self.LastVoltages, self.LastCurrents)]
+        return [{'voltage': v, 'current': c} for v, c in zip(self.read_voltage(), self.read_current())]
     # endregion SET METHODS
     # --------------------------------------
 
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Typed device events (trips, compliance, ...) and the bus to distribute them
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import deque, Counter
+from datetime import datetime
+from threading import Lock
+from time import time
+from src.utils import warning
+
+
+class DeviceEvent(object):
+    """ Change of a condition of a channel. [active] is False if the condition was cleared. """
+
+    Name = 'EVENT'
+
+    def __init__(self, device, channel=0, active=True, info='', t=None):
+        self.Device = device
+        self.Channel = channel
+        self.Active = active
+        self.Info = info
+        self.Time = time() if t is None else t
+
+    def __str__(self):
+        return '{}{} on {} CH{}{}'.format(self.Name, '' if self.Active else ' CLEARED', self.Device, self.Channel, ' ({})'.format(self.Info) if self.Info else '')
+
+    def __repr__(self):
+        return '{} {}'.format(datetime.fromtimestamp(self.Time).strftime('%H:%M:%S'), self)
+
+
+class TripEvent(DeviceEvent):
+    Name = 'TRIP'
+
+
+class ComplianceEvent(DeviceEvent):
+    Name = 'COMPLIANCE'
+
+
+class LimitEvent(DeviceEvent):
+    """ Hardware limit exceeded. """
+    Name = 'LIMIT'
+
+
+class VoltageLimitEvent(LimitEvent):
+    Name = 'VOLTAGE_LIMIT'
+
+
+class CurrentLimitEvent(LimitEvent):
+    Name = 'CURRENT_LIMIT'
+
+
+class InhibitEvent(DeviceEvent):
+    Name = 'INHIBIT'
+
+
+class EmergencyOffEvent(DeviceEvent):
+    Name = 'EMERGENCY_OFF'
+
+
+class EventBus(object):
+    """ Calls all subscribers with every published event in the thread of the publisher and keeps the last [size] events. """
+
+    def __init__(self, size=1000):
+        self.Subscribers = []
+        self.Events = deque(maxlen=size)
+        self.Counts = Counter()
+        self.Lock = Lock()
+
+    def subscribe(self, callback):
+        with self.Lock:
+            self.Subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        with self.Lock:
+            if callback in self.Subscribers:
+                self.Subscribers.remove(callback)
+
+    def publish(self, event):
+        with self.Lock:
+            self.Events.append(event)
+            self.Counts[event.Name] += event.Active
+            subscribers = list(self.Subscribers)
+        for callback in subscribers:
+            try:
+                callback(event)
+            except Exception as err:
+                warning('Error in event subscriber: {}'.format(err))
+
+    def get_events(self):
+        with self.Lock:
+            return list(self.Events)
+
+    def get_counts(self):
+        """ :returns: number of raised events per type. """
+        with self.Lock:
+            return dict(self.Counts)
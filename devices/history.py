@@ -0,0 +1,48 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       In-memory history of the readings of a channel
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from numpy import zeros, searchsorted, inf
+
+
+class History(object):
+    """ Ring buffer holding the last [capacity] readings of a channel in a NumPy structured array.
+        Every entry is written twice (at i and at i + capacity), so the latest entries always form one contiguous slice
+        and range queries return views without copying. A view stays valid until [capacity] new entries were added. """
+
+    DType = [('time', 'f8'), ('voltage', 'f8'), ('current', 'f8'), ('status', '?')]
+
+    def __init__(self, capacity=36000):
+        self.Capacity = capacity
+        self.Data = zeros(2 * capacity, dtype=History.DType)
+        self.Index = 0  # position of the next entry
+        self.N = 0
+
+    def __len__(self):
+        return self.N
+
+    def add(self, t, voltage, current, status):
+        entry = (t, voltage, current, status)
+        self.Data[self.Index] = entry
+        self.Data[self.Index + self.Capacity] = entry
+        self.Index = (self.Index + 1) % self.Capacity
+        self.N = min(self.N + 1, self.Capacity)
+
+    def get_data(self):
+        """ :returns: view of all stored entries in chronological order. """
+        end = self.Index + self.Capacity
+        return self.Data[end - self.N:end]
+
+    def get_range(self, t0=None, t1=None):
+        """ :returns: view of the entries with t0 <= time <= t1. """
+        return History.select(self.get_data(), t0, t1)
+
+    @staticmethod
+    def select(data, t0=None, t1=None):
+        t = data['time']
+        return data[searchsorted(t, -inf if t0 is None else t0, 'left'):searchsorted(t, inf if t1 is None else t1, 'right')]
+
+    def clear(self):
+        self.Index = self.N = 0
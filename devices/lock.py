@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Fair I/O lock for the HV devices
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import deque
+from threading import Condition, get_ident
+from time import monotonic
+
+
+class FairLock(object):
+    """ Reentrant lock which is granted in the order of the requests (FIFO) and records the waiting times. """
+
+    def __init__(self, name='', timeout=20):
+        self.Name = name
+        self.Timeout = timeout  # seconds, None waits forever
+        self.Condition = Condition()
+        self.Queue = deque()
+        self.Owner = None
+        self.Count = 0
+
+        # Statistics
+        self.NAcquired = 0
+        self.NTimeouts = 0
+        self.TotalWait = 0.
+        self.MaxWait = 0.
+
+    def __enter__(self):
+        if not self.acquire():
+            raise TimeoutError('Cannot access {} - device is busy for more than {} s'.format(self.Name, self.Timeout))
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+    def acquire(self, timeout=-1):
+        """ :returns: whether the lock was acquired within [timeout] seconds (-1: default timeout). """
+        timeout = self.Timeout if timeout == -1 else timeout
+        thread_id, t0 = get_ident(), monotonic()
+        with self.Condition:
+            if self.Owner == thread_id:
+                self.Count += 1
+                return True
+            self.Queue.append(thread_id)
+            while self.Owner is not None or self.Queue[0] != thread_id:
+                remaining = None if timeout is None else t0 + timeout - monotonic()
+                if remaining is not None and remaining <= 0:
+                    self.Queue.remove(thread_id)
+                    self.NTimeouts += 1
+                    self.Condition.notify_all()
+                    return False
+                self.Condition.wait(remaining)
+            self.Queue.popleft()
+            self.Owner, self.Count = thread_id, 1
+            self.add_wait_time(monotonic() - t0)
+            return True
+
+    def release(self):
+        with self.Condition:
+            if self.Owner != get_ident():
+                raise RuntimeError('cannot release a lock of {} which is not owned by this thread'.format(self.Name))
+            self.Count -= 1
+            if not self.Count:
+                self.Owner = None
+                self.Condition.notify_all()
+
+    def locked(self):
+        return self.Owner is not None
+
+    def add_wait_time(self, t):
+        self.NAcquired += 1
+        self.TotalWait += t
+        self.MaxWait = max(self.MaxWait, t)
+
+    def get_mean_wait(self):
+        return self.TotalWait / self.NAcquired if self.NAcquired else 0.
+
+    def get_stats(self):
+        return {'acquired': self.NAcquired, 'timeouts': self.NTimeouts, 'waiting': len(self.Queue), 'mean wait': self.get_mean_wait(), 'max wait': self.MaxWait}
@@ -0,0 +1,276 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Runs a device in its own process, the readings are shared via shared memory
+# created on October 18th 2026
+# --------------------------------------------------------
+
+import atexit
+from multiprocessing import Process, Pipe
+from multiprocessing.shared_memory import SharedMemory
+from threading import Thread, Lock, Event, current_thread
+from time import monotonic
+from numpy import ndarray, dtype
+from devices.device import Device
+from devices.history import History
+from devices.reading import Reading
+from src.utils import info, warning
+
+
+class SharedHistory(History):
+    """ History of a channel in shared memory. The process creating it owns the memory and only gets read-only views,
+        the worker process attaches to it by name and writes. A sequence counter detects reads overlapping a write, so
+        all readers get copies instead of views. """
+
+    HeaderType = [('index', 'i8'), ('n', 'i8'), ('seq', 'i8')]
+
+    def __init__(self, capacity=36000, name=None):
+        self.IsOwner = name is None
+        header_size = dtype(SharedHistory.HeaderType).itemsize
+        self.Memory = SharedMemory(name, self.IsOwner, header_size + 2 * capacity * dtype(History.DType).itemsize)
+        self.Header = ndarray(1, SharedHistory.HeaderType, self.Memory.buf)
+        self.Data = ndarray(2 * capacity, History.DType, self.Memory.buf, offset=header_size)
+        self.Capacity = capacity
+        if self.IsOwner:
+            self.Index = self.N = 0
+            self.Header['seq'] = 0
+            self.Header.flags.writeable = self.Data.flags.writeable = False
+        else:
+            self.reset_seq()
+
+    @property
+    def Index(self):
+        return int(self.Header['index'][0])
+
+    @Index.setter
+    def Index(self, value):
+        self.Header['index'] = value
+
+    @property
+    def N(self):
+        return int(self.Header['n'][0])
+
+    @N.setter
+    def N(self, value):
+        self.Header['n'] = value
+
+    def add(self, t, voltage, current, status):
+        self.Header['seq'] += 1  # odd while writing
+        History.add(self, t, voltage, current, status)
+        self.Header['seq'] += 1
+
+    def reset_seq(self):
+        """ Make the sequence counter even again if the previous writer was terminated in the middle of a write. """
+        header = ndarray(1, SharedHistory.HeaderType, self.Memory.buf)  # the header of the owner is read-only
+        header['seq'] += header['seq'] % 2
+
+    def read(self, func, *args):
+        """ :returns: a copy of the result of func(*args), repeated until no write overlapped it. """
+        while True:
+            seq = self.Header['seq'][0]
+            if seq % 2 == 0:
+                result = func(*args)
+                result = None if result is None else result.copy()
+                if self.Header['seq'][0] == seq:
+                    return result
+
+    def get_last(self):
+        """ :returns: a consistent copy of the latest entry or None if there is none yet. """
+        return self.read(lambda: self.Data[self.Index - 1 + self.Capacity] if self.N else None)
+
+    def get_data(self):
+        """ :returns: a consistent copy of all stored entries, views of the shared memory may change while they are read. """
+        return self.read(History.get_data, self)
+
+    def get_range(self, t0=None, t1=None):
+        """ :returns: a consistent copy of the entries with t0 <= time <= t1. """
+        return self.read(lambda: History.select(History.get_data(self), t0, t1))
+
+    def close(self):
+        self.Header = self.Data = None  # release the views before closing the memory
+        self.Memory.close()
+        if self.IsOwner:
+            self.Memory.unlink()
+
+
+class SharedState(object):
+    """ Status of the device which is not contained in the readings, written by the worker process. """
+
+    def __init__(self, n_channels, name=None):
+        self.DType = [('heartbeat', 'f8'), ('update', 'f8'), ('status', '?', n_channels), ('target', 'f8', n_channels), ('powering down', '?', n_channels)]
+        self.IsOwner = name is None
+        self.Memory = SharedMemory(name, self.IsOwner, dtype(self.DType).itemsize)
+        self.Data = ndarray(1, self.DType, self.Memory.buf)
+
+    def write(self, device):
+        self.Data['update'] = device.LastUpdate
+        self.Data['status'] = device.Status
+        self.Data['target'] = device.TargetBias
+        self.Data['powering down'] = device.IsPoweringDown
+        self.Data['heartbeat'] = device.Heartbeat
+
+    def get(self, name):
+        return self.Data[name][0]
+
+    def close(self):
+        self.Data = None
+        self.Memory.close()
+        if self.IsOwner:
+            self.Memory.unlink()
+
+
+def run_worker(cls, device_nr, config, hot_start, print_logs, history_names, state_name, conn):
+    """ Main function of the worker process: runs the device and executes the commands received through [conn]. """
+    device = cls(device_nr, config, hot_start, print_logs)
+    device.History = [SharedHistory(device.History[ch].Capacity, name) for ch, name in enumerate(history_names)]
+    for recorder, history in zip(device.Transients, device.History):
+        if recorder is not None:
+            recorder.History = history
+    state = SharedState(device.NChannels, state_name)
+    lock = Lock()  # the connection is used by the poll and the listening thread
+
+    def send(*msg):
+        with lock:
+            conn.send(msg)
+    device.Events.subscribe(lambda event: send('event', event))
+    Thread(target=listen, args=(device, conn, send), daemon=True).start()
+    Thread(target=device.run_ramp, daemon=True).start()
+    device.Ticker.reset()
+    while not device.IsKilled:
+        device.Ticker.wait(device.get_period())
+        device.poll()
+        state.write(device)
+
+
+def listen(device, conn, send):
+    while not device.IsKilled:
+        try:
+            name, args = conn.recv()
+        except (EOFError, OSError):
+            name, args = 'stop', ()
+        if name == 'stop':
+            device.IsKilled = True
+        elif name == 'emergency_off':
+            send('emergency_off', device.emergency_off(*args))
+        else:
+            device.submit(getattr(device, name), *args)
+
+
+class ProcessDevice(Device):
+    """ Proxy for a device of type [cls] running in a separate process. The readings are mapped from shared memory and
+        the commands are sent through a pipe, so the acquisition does not compete with the GUI for the GIL. """
+
+    def __init__(self, cls, device_nr, config='main', hot_start=True, print_logs=False):
+        Device.__init__(self, device_nr, config, hot_start, print_logs, init_logger=False)
+
+        self.Class = cls
+        self.DeviceNr = device_nr
+        self.Model = self.ModelNumber
+        self.Transients = [None] * self.NChannels  # recorded by the worker
+        self.Events.unsubscribe(self.log_event)  # logged by the worker
+
+        self.History = [SharedHistory(self.History[ch].Capacity) for ch in range(self.NChannels)]
+        self.State = SharedState(self.NChannels)
+        self.Pipe = None
+        self.PipeLock = Lock()
+        self.EmergencyOffDone = Event()
+        self.Process = None
+        self.start_process()
+        atexit.register(self.close)
+
+    def start_process(self):
+        self.Pipe, conn = Pipe()
+        args = (self.Class, self.DeviceNr, self.Config.MainFile, self.HotStart, self.PrintLogs, [h.Memory.name for h in self.History], self.State.Memory.name, conn)
+        self.Process = Process(target=run_worker, args=args, name='HV{}'.format(self.DeviceNr), daemon=True)
+        self.Process.start()
+        Thread(target=self.receive, args=(self.Pipe,), daemon=True).start()
+        info('started {} in process {}'.format(self.Config.Section, self.Process.pid))
+
+    def stop_process(self):
+        if self.Process is not None and self.Process.is_alive():
+            self.Process.terminate()
+            self.Process.join(1)
+            for history in self.History:
+                history.reset_seq()  # do not block the readers until the new worker attached
+
+    def connect(self):
+        """ Restarts the worker process. """
+        self.stop_process()
+        self.HotStart = True
+        self.start_process()
+
+    def close(self):
+        if self.Process is None:  # already closed
+            return
+        self.IsKilled = True
+        if self.is_alive() and current_thread() is not self:
+            self.join(2 * self.get_period())  # the proxy loop reads the shared memory
+        self.send('stop')
+        self.stop_process()
+        self.Process = None
+        for memory in self.History + [self.State]:
+            memory.close()
+
+    def receive(self, pipe):
+        """ Republishes the events of the worker. """
+        while True:
+            try:
+                name, event = pipe.recv()
+            except (EOFError, OSError):
+                return
+            if name == 'event':
+                self.Events.publish(event)
+            elif name == 'emergency_off':
+                self.EmergencyOffDone.set()
+
+    def send(self, name, *args):
+        try:
+            with self.PipeLock:
+                self.Pipe.send((name, args))
+        except (BrokenPipeError, OSError) as err:
+            warning('Could not send {} to {}: {}'.format(name, self.Config.Section, err))
+
+    def poll(self):
+        self.Commands.execute()
+        self.Status[:] = self.State.get('status')
+        self.TargetBias[:] = self.State.get('target')
+        self.IsPoweringDown[:] = self.State.get('powering down')
+        for channel in self.ActiveChannels:
+            entry = self.History[channel].get_last()
+            if entry is not None and entry['time'] != self.Readings[channel].Time:
+                self.update_reading(channel, entry)
+        self.LastUpdate = self.State.get('update')
+        self.Heartbeat = max(self.Heartbeat, self.State.get('heartbeat'))  # the monotonic clock is shared by all processes
+
+    def update_reading(self, channel, entry):
+        with self.NewReading:
+            self.BiasNow[channel] = entry['voltage']
+            self.CurrentNow[channel] = entry['current']
+            self.Readings[channel] = Reading(entry['time'], entry['voltage'], entry['current'], entry['status'], self.Readings[channel].Seq + 1)
+            self.NewReading.notify_all()
+
+    def step_ramp(self):
+        """The worker ramps on its own."""
+        pass
+
+    def set_target_bias(self, target, channel):
+        if self.validate_voltage(target, channel):
+            self.send('set_target_bias', target, channel)
+
+    def set_output(self, status, channel=0):
+        self.send('set_output', status, channel)
+
+    def power_down(self, channel=0):
+        self.send('power_down', channel)
+
+    def set_ramp_speed(self, speed, channel=0):
+        self.RampSpeed[channel] = speed
+        self.send('set_ramp_speed', speed, channel)
+
+    def emergency_off(self, timeout=.5):
+        """ :returns: the time until the worker process confirmed that the kill command was sent to the device. """
+        t = monotonic()
+        self.EmergencyOffDone.clear()
+        self.send('emergency_off', timeout)
+        if not self.EmergencyOffDone.wait(timeout + 1):
+            raise TimeoutError('{} did not confirm the emergency off'.format(self.Config.Section))
+        return monotonic() - t
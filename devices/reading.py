@@ -0,0 +1,21 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Immutable reading record of a single channel
+# created on October 18th 2026
+# --------------------------------------------------------
+
+
+class Reading(object):
+    """ Snapshot of one channel. A new object is created for every sample, so a reference to it never changes. """
+
+    __slots__ = ('Time', 'Voltage', 'Current', 'Status', 'Seq')
+
+    def __init__(self, t=0., voltage=0., current=0., status=False, seq=0):
+        for name, value in zip(Reading.__slots__, [t, voltage, current, status, seq]):
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, key, value):
+        raise AttributeError('Reading is immutable')
+
+    def __repr__(self):
+        return 'Reading(#{}, t={:.3f}, {:.3f} V, {:.3e} A, {})'.format(self.Seq, self.Time, self.Voltage, self.Current, 'ON' if self.Status else 'OFF')
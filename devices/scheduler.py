@@ -0,0 +1,136 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Shared scheduler to poll several devices with a bounded pool of worker threads
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from concurrent.futures import ThreadPoolExecutor
+from threading import Thread, Condition
+from time import monotonic
+from src.utils import info, warning
+from devices.timing import Ticker
+
+
+class Task(object):
+    """ Periodic job of the scheduler. If several tasks are due, the one with the lowest priority value runs first. """
+
+    def __init__(self, name, func, period, priority=0, ticker=None):
+        self.Name = name
+        self.Func = func
+        self.Period = period  # either a number in seconds or a function returning it
+        self.Priority = priority
+        self.Ticker = Ticker() if ticker is None else ticker
+        self.Ticker.reset()
+        self.NextTime = self.Ticker.next()
+        self.IsRunning = False
+        self.WakePending = False  # woken while running, run again right after the current call
+        self.NCalls = 0
+
+    def get_period(self):
+        return self.Period() if callable(self.Period) else self.Period
+
+    def reschedule(self):
+        self.NextTime = self.Ticker.next(self.get_period())
+        if self.WakePending:
+            self.WakePending = False
+            self.run_now()
+
+    def run_now(self):
+        self.Ticker.skip_to_now()
+        self.NextTime = self.Ticker.NextTime
+
+
+class Scheduler(Thread):
+    """ Dispatches the periodic tasks of all devices to a fixed number of worker threads. """
+
+    def __init__(self, n_workers=4):
+        Thread.__init__(self, daemon=True)
+
+        self.NWorkers = n_workers
+        self.Pool = ThreadPoolExecutor(n_workers, thread_name_prefix='HVWorker')
+        self.Tasks = []
+        self.DeviceTasks = {}
+        self.NRunning = 0
+        self.Condition = Condition()
+        self.IsKilled = False
+
+    def add_task(self, name, func, period, priority=0, ticker=None):
+        task = Task(name, func, period, priority, ticker)
+        task.Ticker.OnWake = lambda: self.wake(task)
+        with self.Condition:
+            self.Tasks.append(task)
+            self.Condition.notify()
+        return task
+
+    def add_device(self, device):
+        device.Heartbeat = monotonic()
+        tasks = [self.add_task(device.Config.Section, device.poll, device.get_period, device.Priority, device.Ticker)]
+        if not device.FromLogs:
+            tasks.append(self.add_task('{} ramp'.format(device.Config.Section), device.step_ramp, device.RampPeriod, device.RampPriority, device.RampTicker))
+        self.DeviceTasks[device.Config.Section] = tasks
+        return tasks
+
+    def restart_device(self, device):
+        """ Reconnect [device]. A stalled call keeps its worker and its task until it returns, which usually happens right
+            away since the call fails once the old connection is closed. So the pool is never oversubscribed and a task
+            never runs twice at once. """
+        device.reset_io()
+        device.NRestarts += 1
+
+    def wake(self, task):
+        """ Run [task] as soon as possible instead of at its next deadline. A running task is run again right after it finished. """
+        with self.Condition:
+            task.Ticker.Wakeup.clear()  # nobody waits on it here
+            if task.IsRunning:
+                task.WakePending = True
+            else:
+                task.run_now()
+                self.Condition.notify()
+
+    def remove_task(self, task):
+        with self.Condition:
+            if task in self.Tasks:
+                self.Tasks.remove(task)
+
+    def stop(self):
+        with self.Condition:
+            self.IsKilled = True
+            self.Condition.notify()
+        self.Pool.shutdown(wait=False)
+        info('stopped scheduler')
+
+    def get_next_task(self):
+        """ :returns: the due task with the highest priority and the time to wait if there is none. """
+        now = monotonic()
+        idle = [task for task in self.Tasks if not task.IsRunning]
+        due = [task for task in idle if task.NextTime <= now]
+        if due and self.NRunning < self.NWorkers:
+            return min(due, key=lambda t: (t.Priority, t.NextTime)), 0
+        return None, min([task.NextTime - now for task in idle], default=1) if not due else None
+
+    def run(self):
+        info('starting scheduler with {} workers for {} tasks'.format(self.NWorkers, len(self.Tasks)))
+        while True:
+            with self.Condition:
+                if self.IsKilled:
+                    return
+                task, timeout = self.get_next_task()
+                if task is None:
+                    self.Condition.wait(timeout)
+                    continue
+                task.IsRunning = True
+                self.NRunning += 1
+            self.Pool.submit(self.execute, task)
+
+    def execute(self, task):
+        try:
+            task.Func()
+            task.NCalls += 1
+        except Exception as err:
+            warning('Error in scheduled task {}: {}'.format(task.Name, err))
+        finally:
+            with self.Condition:
+                task.reschedule()
+                task.IsRunning = False
+                self.NRunning -= 1
+                self.Condition.notify()
@@ -0,0 +1,103 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Timing utilities for the acquisition loops
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from collections import deque
+from threading import Event
+from time import monotonic
+from numpy import array, argmin, inf
+
+
+class Ticker(object):
+    """ Fixed-rate schedule on the monotonic clock. The work time of a cycle is compensated and if a cycle takes longer
+        than the period, the deadlines which were missed are skipped instead of being caught up in a burst. """
+
+    def __init__(self, period=.1):
+        self.Period = period
+        self.NextTime = None
+        self.Wakeup = Event()
+        self.OnWake = None  # called by wake() for schedulers which do not block in wait()
+
+        # Statistics
+        self.NTicks = 0
+        self.NOverruns = 0  # cycles which were not finished before the next deadline
+        self.NMissed = 0  # deadlines which were skipped entirely
+        self.MaxDelay = 0.
+
+    def reset(self):
+        self.NextTime = None
+
+    def next(self, period=None):
+        """ :returns: the next deadline on the monotonic clock. """
+        period = self.Period if period is None else period
+        now = monotonic()
+        self.NextTime = now if self.NextTime is None else self.NextTime + period
+        self.NTicks += 1
+        if now > self.NextTime:
+            delay = now - self.NextTime
+            self.NOverruns += 1
+            self.NMissed += int(delay // period)
+            self.MaxDelay = max(self.MaxDelay, delay)
+            self.NextTime += delay // period * period
+        return self.NextTime
+
+    def wait(self, period=None):
+        if self.Wakeup.wait(max(0, self.next(period) - monotonic())):
+            self.Wakeup.clear()
+            self.skip_to_now()
+
+    def wake(self):
+        """ End the current wait right away, e.g. if a new target was set while waiting for a long period. """
+        self.Wakeup.set()
+        if self.OnWake is not None:
+            self.OnWake()
+
+    def skip_to_now(self):
+        """ Move the pending deadline to now, the following ones are counted from here. """
+        self.NextTime = monotonic()
+
+    def get_stats(self):
+        return {'ticks': self.NTicks, 'overruns': self.NOverruns, 'missed': self.NMissed, 'max delay': self.MaxDelay}
+
+
+class ClockSync(object):
+    """ Maps the timestamps of an instrument onto the host clock: t_host = t_instrument + offset + drift * (t_instrument - t_ref).
+        Both are estimated from the lower envelope of the difference between receive and instrument time over the last
+        [window] samples, i.e. from the samples with the shortest transport delay. So the mapped time is when the
+        measurement happened and not when the answer was read from the bus. The mapped times of the samples passed to
+        add() never decrease, so they can be stored in the sorted history. """
+
+    def __init__(self, window=1000, min_samples=10):
+        self.Samples = deque(maxlen=window)
+        self.MinSamples = min_samples
+        self.Offset = None
+        self.Drift = 0.
+        self.Ref = 0.
+        self.NResets = 0  # number of times the instrument clock went backwards
+        self.Last = -inf  # last mapped time, the output never goes backwards
+
+    def add(self, t_instrument, t_host):
+        """ Update the estimate with a sample received at [t_host]. :returns: the mapped time of the sample. """
+        if self.Samples and t_instrument < self.Samples[-1][0]:
+            self.Samples.clear()
+            self.Drift = 0.
+            self.NResets += 1
+        self.Samples.append((t_instrument, t_host))
+        ti, th = array(self.Samples).T
+        d = th - ti
+        self.Ref = ti[0]
+        if ti.size >= self.MinSamples:
+            half = ti.size // 2
+            i, j = argmin(d[:half]), half + argmin(d[half:])  # fastest sample of each half
+            self.Drift = (d[j] - d[i]) / (ti[j] - ti[i]) if ti[j] > ti[i] else self.Drift
+        self.Offset = min(d - self.Drift * (ti - self.Ref))
+        self.Last = max(self.map(t_instrument), self.Last)  # a new estimate or a reset may map a sample before the previous one
+        return self.Last
+
+    def map(self, t_instrument):
+        return t_instrument + self.Offset + self.Drift * (t_instrument - self.Ref)
+
+    def get_stats(self):
+        return {'offset': self.Offset, 'drift': self.Drift, 'samples': len(self.Samples), 'resets': self.NResets}
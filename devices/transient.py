@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Recorder for current spikes and breakdowns
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from datetime import datetime
+from os.path import join
+from threading import Thread
+from numpy import save
+from src.utils import ensure_dir, warning
+
+
+class TransientRecorder(object):
+    """ Watches the readings of a channel and fires if the current exceeds [threshold] or changes faster than [didt].
+        The readings from [pre] seconds before until [post] seconds after the trigger are then dumped from the
+        pre-trigger buffer (the history of the channel, which holds every reading at the full rate, while the log
+        is decimated to the 'log period') into a separate .npy capture file. """
+
+    def __init__(self, history, directory, name, didt=0, threshold=0, pre=10, post=10):
+        self.History = history
+        self.Dir = directory
+        self.Name = name
+
+        self.DIDt = didt  # A/s, 0 to disable
+        self.Threshold = threshold  # A, 0 to disable
+        self.Pre = pre  # seconds
+        self.Post = post  # seconds
+
+        self.TriggerTime = None
+        self.LastTime = None
+        self.LastCurrent = None
+        self.NCaptures = 0
+
+    def add(self, t, current):
+        """ :returns: the name of the capture file if the post-trigger window was completed with this reading. """
+        file_name = None
+        if self.TriggerTime is None:
+            if self.is_triggered(t, current):
+                self.TriggerTime = t
+                warning('Transient on {} at {:.3e} A'.format(self.Name, current))
+        elif t - self.TriggerTime >= self.Post:
+            file_name = self.dump()
+        self.LastTime, self.LastCurrent = t, current
+        return file_name
+
+    def is_triggered(self, t, current):
+        if self.Threshold and abs(current) > self.Threshold:
+            return True
+        if self.DIDt and self.LastTime is not None and t > self.LastTime:
+            return abs((current - self.LastCurrent) / (t - self.LastTime)) > self.DIDt
+        return False
+
+    def dump(self):
+        """ Copy the capture window and write it in a separate thread, since this is called from the readout with the device lock held. """
+        file_name = join(self.Dir, '{}_{}.npy'.format(self.Name, datetime.fromtimestamp(self.TriggerTime).strftime('%Y_%m_%d_%H_%M_%S')))
+        data = self.History.get_range(self.TriggerTime - self.Pre, self.TriggerTime + self.Post).copy()
+        Thread(target=self.save, args=(file_name, data), name='TransientDump').start()
+        self.TriggerTime = None
+        self.NCaptures += 1
+        return file_name
+
+    def save(self, file_name, data):
+        ensure_dir(self.Dir)
+        save(file_name, data)
@@ -0,0 +1,89 @@
+#!/usr/bin/env python
+# --------------------------------------------------------
+#       Supervisor restarting devices whose I/O got stuck
+# created on October 18th 2026
+# --------------------------------------------------------
+
+from threading import Thread, Event
+from time import monotonic
+from src.utils import info, warning
+
+
+class StallStats(object):
+    """ Stall metrics of a single device. """
+
+    def __init__(self):
+        self.NStalls = 0
+        self.StallStart = None  # monotonic time of the last heartbeat before the current stall
+        self.TotalTime = 0.
+        self.MaxTime = 0.
+        self.LastRestart = -1e9
+
+    def is_stalled(self):
+        return self.StallStart is not None
+
+    def get_current(self):
+        return monotonic() - self.StallStart if self.is_stalled() else 0.
+
+    def start(self, heartbeat):
+        self.NStalls += 1
+        self.StallStart = heartbeat
+
+    def end(self):
+        duration = self.get_current()
+        self.TotalTime += duration
+        self.MaxTime = max(self.MaxTime, duration)
+        self.StallStart = None
+        return duration
+
+
+class Watchdog(Thread):
+    """ Checks the heartbeat of every device, i.e. the time of its last successful readout. If it is older than the
+        'stall deadline' of the device, the device is flagged as stalled and, if [restart] is set, reconnected and its
+        worker restarted by the scheduler (or by the device itself if it runs in its own thread). """
+
+    def __init__(self, devices, scheduler=None, period=1, restart=True):
+        Thread.__init__(self, daemon=True)
+
+        self.Devices = devices
+        self.Scheduler = scheduler
+        self.Period = period
+        self.Restart = restart
+        self.Stats = {device.Config.Section: StallStats() for device in devices}
+        self.Stop = Event()
+
+    def run(self):
+        info('starting watchdog for {} devices'.format(len(self.Devices)))
+        while not self.Stop.wait(self.Period):
+            for device in self.Devices:
+                if not device.IsKilled:
+                    self.check(device)
+
+    def stop(self):
+        self.Stop.set()
+
+    def check(self, device):
+        stats = self.Stats[device.Config.Section]
+        age = device.get_heartbeat_age()
+        if device.StallDeadline and age > device.StallDeadline:
+            if not stats.is_stalled():
+                stats.start(device.Heartbeat)
+                warning('{} stalled - no update for {:.1f} s'.format(device.Config.Section, age))
+            if self.Restart and monotonic() - stats.LastRestart > device.StallDeadline:  # retry if the restart did not help
+                stats.LastRestart = monotonic()
+                self.restart(device)
+        elif stats.is_stalled():
+            info('{} recovered after {:.1f} s'.format(device.Config.Section, stats.end()))
+
+    def restart(self, device):
+        info('restarting {}'.format(device.Config.Section))
+        try:
+            device.restart() if self.Scheduler is None else self.Scheduler.restart_device(device)
+        except Exception as err:
+            warning('Could not restart {}: {}'.format(device.Config.Section, err))
+
+    def get_stats(self):
+        """ :returns: the stall metrics of every device. """
+        return {device.Config.Section: {'stalls': stats.NStalls, 'stalled': stats.is_stalled(), 'stall time': stats.get_current(), 'total stall time': stats.TotalTime + stats.get_current(),
+                                        'max stall time': max(stats.MaxTime, stats.get_current()), 'heartbeat age': device.get_heartbeat_age(), 'restarts': device.NRestarts}
+                for device, stats in [(d, self.Stats[d.Config.Section]) for d in self.Devices]}
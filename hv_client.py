@@ -22,6 +22,6 @@ Gui.query_channels(args.config)
 
 device_list = get_dummies(args.config) if args.test else get_devices(args.config, not args.restart, print_logs=True)
 
-g = Gui(device_list)
+g = Gui(device_list, scheduler=get_scheduler(args.config))
 
 end(app.exec_())
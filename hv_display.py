@@ -25,5 +25,5 @@ Gui.query_channels(args.config)
 
 device_list = get_logging_devices(args.config, args.start_time)
 
-g = Gui(device_list, from_logs=True)
+g = Gui(device_list, from_logs=True, scheduler=get_scheduler(args.config))
 end(app.exec_())
@@ -42,6 +42,8 @@ class Config(ConfigParser):
     def get_value(self, option, dtype: Any = str, section=None, default=None):
         try:
             v = self.get(choose(section, self.Section), option)
+            if dtype is bool:
+                return self.getboolean(choose(section, self.Section), option)
             return loads(v) if dtype == list or '[' in v and dtype is not str else dtype(v)
         except (NoOptionError, NoSectionError):
             return default
@@ -7,6 +7,7 @@
 
 import signal
 from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
 from devices.device import *
 from devices.dummy import Dummy
 from devices.ISEG import ISEG
@@ -14,6 +15,9 @@ from devices.Keithley23X import Keithley23X
 from devices.Keithley24XX import Keithley24XX
 from devices.Keithley2657 import Keithley2657
 from devices.Keithley6517B import Keithley6517B
+from devices.scheduler import Scheduler
+from devices.async_device import AsyncEngine
+from devices.watchdog import Watchdog
 from src.config import Config
 
 device_dic = {'2400': Keithley24XX,
@@ -34,7 +38,7 @@ def get_devices(config, hot_start, print_logs=False):
     print('Loading HV devices: {}'.format(device_nrs))
     print('=======================================')
     print('\n=============INSTANTIATION=============')
-    return [init_device(nr, c, hot_start, print_logs) for nr in device_nrs]
+    return [init_device(nr, c, hot_start, print_logs, c.get_value('processes', bool, 'Devices', default=False)) for nr in device_nrs]
 
 
 def get_logging_devices(config, start_time):
@@ -47,9 +51,56 @@ def get_dummies(config):
     return [Dummy(nr, config, hot_start=True, init_logger=False) for nr in c.get_active_devices()]
 
 
-def init_device(device_nr, config, hot_start, print_logs=False):
+def get_scheduler(config):
+    """:returns: the asyncio engine or a shared scheduler if set in the config, otherwise every device runs in its own thread."""
+    c = Config(config)
+    if c.get_value('engine', section='Devices', default='') == 'asyncio':
+        return AsyncEngine()
+    n_workers = c.get_value('workers', int, 'Devices', default=0)
+    return Scheduler(n_workers) if n_workers > 0 else None
+
+
+def start_devices(devices, scheduler=None, watchdog=True, block=False):
+    """ :param block: run the scheduler in the calling thread until all devices are killed (headless mode).
+        :returns: the watchdog supervising the devices or None."""
+    for device in devices:
+        scheduler.add_device(device) if scheduler is not None else device.start()
+    dog = Watchdog(devices, scheduler) if watchdog else None
+    if dog is not None:
+        dog.start()
+    if scheduler is not None:
+        scheduler.run() if block else scheduler.start()
+    return dog
+
+
+def wait_for_devices(devices):
+    """ Block until all devices are killed. The scheduler, the watchdog and the threads of restarted devices are daemons. """
+    while not all(device.IsKilled for device in devices):
+        sleep(1)
+
+
+def emergency_off(devices, timeout=.5):
+    """ Switch off all devices in parallel. :returns: dict with the latency of every device in seconds (None if it failed). """
+    with ThreadPoolExecutor(max(len(devices), 1), thread_name_prefix='EmergencyOff') as pool:
+        futures = {device.Config.Section: pool.submit(device.emergency_off, timeout) for device in devices}
+    latencies = {}
+    for name, future in futures.items():
+        try:
+            latencies[name] = future.result()
+            info('Emergency off {}: {:.3f} s'.format(name, latencies[name]))
+        except Exception as err:
+            latencies[name] = None
+            warning('Emergency off failed for {}: {}'.format(name, err))
+    return latencies
+
+
+def init_device(device_nr, config, hot_start, print_logs=False, process=False):
+    """ :param process: run the device in a separate worker process and return a proxy for it. """
     model = config.get('HV{}'.format(device_nr), 'model')
-    print('Instantiating {}'.format(model))
+    print('Instantiating {}{}'.format(model, ' in a worker process' if process else ''))
+    if process:
+        from devices.process_device import ProcessDevice  # shared memory needs python 3.8
+        return ProcessDevice(device_dic[model], device_nr, config.MainFile, hot_start, print_logs)
     device = device_dic[model](device_nr, config.MainFile, hot_start, print_logs)
     print('successfully instantiated {} with model number {}'.format(device.Names, device.Model))
     print('active channels: {}'.format(device.ActiveChannels))
@@ -64,13 +115,16 @@ if __name__ == '__main__':
     args = parser.parse_args()
 
     devices = get_devices(args.config, not args.restart, print_logs=True)
-
-    for dev in devices:
-        dev.start()
+    sched = get_scheduler(args.config)
 
     def signal_handler(signal, frame):
         print('Received SIGINT bla')
         for d in devices:
             d.IsKilled = True
+        if sched is not None:
+            sched.stop()
 
     signal.signal(signal.SIGINT, signal_handler)
+    dog = start_devices(devices, sched, block=isinstance(sched, AsyncEngine))  # the event loop runs in the main thread
+    wait_for_devices(devices)
+    dog.stop()
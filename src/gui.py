@@ -12,14 +12,14 @@ from warnings import filterwarnings
 from numpy import ceil, where
 
 import qdarkstyle
-from PyQt5.QtCore import QTimer, QPoint, Qt
+from PyQt5.QtCore import QTimer, QPoint, Qt, pyqtSignal
 from PyQt5.QtGui import QIcon, QFont, QCursor
-from PyQt5.QtWidgets import QMainWindow, QApplication, QAction, QFontDialog, QVBoxLayout, QWidget, QHBoxLayout, QInputDialog, QLabel, QDialog, QGridLayout
+from PyQt5.QtWidgets import QMainWindow, QApplication, QAction, QFontDialog, QVBoxLayout, QWidget, QHBoxLayout, QInputDialog, QLabel, QDialog, QGridLayout, QMessageBox
 from serial import SerialException
 
 from src.display_box import DisplayBox
 from src.hv_box import HVBox
-from src.device_reader import get_devices, get_logging_devices, get_dummies
+from src.device_reader import get_devices, get_logging_devices, get_dummies, get_scheduler, start_devices, emergency_off
 from src.utils import *
 from src.live_monitor import LiveMonitor
 from src.config import Config
@@ -34,8 +34,9 @@ from src.device_box import make_line_edit, make_button, make_check_box
 class Gui(QMainWindow):
 
     BUTTON_HEIGHT = 50
+    NewEvent = pyqtSignal(object)  # device events are emitted from the device threads and shown in the GUI thread
 
-    def __init__(self, devices, from_logs=False):
+    def __init__(self, devices, from_logs=False, scheduler=None):
         super(Gui, self).__init__()
 
         self.Dir = dirname(realpath(__file__))
@@ -43,6 +44,10 @@ class Gui(QMainWindow):
 
         # Devices
         self.Devices = devices
+        self.Scheduler = scheduler
+        self.Watchdog = None
+        self.LastEvent = None
+        self.NewEvent.connect(self.show_event)
         self.start_threads(from_logs)
         self.CurrentDevice = self.Devices[0]
         self.CurrentChannel = 0
@@ -69,6 +74,19 @@ class Gui(QMainWindow):
                 device_box.update()
             except (ValueError, SerialException) as err:
                 print(err)
+        if not self.FromLogs:
+            self.show_command_stats()
+
+    def show_command_stats(self):
+        stats = [device.Commands.get_stats() for device in self.Devices]
+        stalled = [name for name, s in self.Watchdog.get_stats().items() if s['stalled']] if self.Watchdog is not None else []
+        self.statusBar().showMessage('queued commands: {}, last latency: {:.2f} s, max latency: {:.2f} s{}{}'.format(
+            sum(s['depth'] for s in stats), max(s['last latency'] for s in stats), max(s['max latency'] for s in stats), ', stalled: {}'.format(', '.join(stalled)) if stalled else '',
+            ', last event: {!r}'.format(self.LastEvent) if self.LastEvent is not None else ''))
+
+    def show_event(self, event):
+        self.LastEvent = event
+        self.statusBar().showMessage(repr(event))
 
     def configure(self):
         h = min(self.NDevices, 3) * 250 + 50
@@ -82,7 +100,8 @@ class Gui(QMainWindow):
     def start_threads(self, from_logs):
         for device in self.Devices:
             device.FromLogs = from_logs
-            device.start()
+            device.Events.subscribe(self.NewEvent.emit)
+        self.Watchdog = start_devices(self.Devices, self.Scheduler, watchdog=not from_logs)
 
     def make_device_boxes(self):
         boxes = []
@@ -130,6 +149,10 @@ class Gui(QMainWindow):
             for section, value in zip(sections, values):
                 config.set_active_channels(section, str(list(where(array(value))[0])))
 
+    def emergency_off(self):
+        latencies = emergency_off(self.Devices)
+        QMessageBox.information(self, 'Emergency Off', '\n'.join('{}: {}'.format(name, 'failed' if t is None else '{:.0f} ms'.format(t * 1000)) for name, t in latencies.items()))
+
     def set_device_names(self):
         labels = ['{} - {}'.format(key, value) for key, value in self.Devices[0].Config.get_sections(active=True).items()]
         values = query_list('Device Names', labels, [dev.get_id() for dev in self.Devices])
@@ -215,6 +238,8 @@ class MenuBar(object):
         self.add_menu('File')
         self.add_menu_entry('File', 'Exit', 'Ctrl+Q', self.close_app, 'Close the Application')
         self.add_menu_entry('File', 'Font', 'Ctrl+F', self.font_choice, 'Open font dialog')
+        if not self.Display:
+            self.add_menu_entry('File', 'Emergency Off', 'Ctrl+K', self.Window.emergency_off, 'Switch off the outputs of all devices')
         if self.Display:
             self.add_menu('Settings')
             self.add_menu_entry('Settings', 'Marker Size', 'Ctrl+M', self.set_ms, 'Open marker size dialog')
@@ -249,6 +274,10 @@ class MenuBar(object):
         info('Closing application')
         for dev in self.Window.Devices:
             dev.IsKilled = True
+        if self.Window.Watchdog is not None:
+            self.Window.Watchdog.stop()
+        if self.Window.Scheduler is not None:
+            self.Window.Scheduler.stop()
         end(2)
 
     def set_ms(self):
@@ -280,5 +309,5 @@ if __name__ == '__main__':
     app = QApplication(['5'])
     filterwarnings('ignore')
     app.setStyleSheet(qdarkstyle.load_stylesheet_pyqt5())
-    g = Gui(device_list, args.from_logs)
+    g = Gui(device_list, args.from_logs, get_scheduler(args.config))
     end(app.exec_())
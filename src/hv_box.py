@@ -52,6 +52,7 @@ class HVBox(DeviceBox):
         if self.Device is None:
             return
         self.set_status_labels()
+        self.OnButton.setText('OFF' if self.Device.get_status(self.Channel) else 'ON')
         self.LiveMonitor.update(self.Unit, int(self.MinCurrent.text()), int(self.MaxCurrent.text()), int(self.MinVoltage.text()), int(self.MaxVoltage.text()),
                                 t_displayed=str(self.DisplayTimes.currentText()))
         self.BiasButton.setEnabled(bool(self.Running.isChecked()))
@@ -59,19 +60,22 @@ class HVBox(DeviceBox):
         self.RampButton.setEnabled(bool(self.Running.isChecked()))
 
     def set_bias(self):
-        self.Device.set_target_bias(int(self.BiasField.text()), self.Channel)
+        self.Device.submit(self.Device.set_target_bias, int(self.BiasField.text()), self.Channel)
 
     def set_output(self):
-        self.Device.power_down(self.Channel) if self.Device.get_status(self.Channel) else self.Device.set_output(ON, self.Channel)
-        self.OnButton.setText('ON' if self.Device.get_status(self.Channel) else 'OFF')
+        if self.Device.get_status(self.Channel):
+            self.Device.submit(self.Device.power_down, self.Channel)
+        else:
+            self.Device.submit(self.Device.set_output, ON, self.Channel)
 
     def set_ramp_speed(self):
-        self.Device.set_ramp_speed(float(self.RampField.text()))
+        self.Device.submit(self.Device.set_ramp_speed, float(self.RampField.text()))
 
     def set_status_labels(self):
+        reading = self.Device.get_reading(self.Channel)  # take one snapshot, so voltage and current belong to the same sample
         self.set_status_label()
-        self.set_voltage_label()
-        self.set_current_label()
+        self.set_voltage_label(reading)
+        self.set_current_label(reading)
 
     def make_placeholder(self):
         layout = QGridLayout(self)
@@ -123,12 +127,13 @@ class HVBox(DeviceBox):
         color = 'orange' if self.Device.is_ramping(self.Channel) else 'green' if self.Device.get_status(self.Channel) else 'red'
         format_widget(self.StatusLabel, color=color, font_size=DeviceBox.FONTSIZE * 2, bold=True, font='ubuntu')
 
-    def set_voltage_label(self):
-        self.VoltageLabel.setText('{v:4.0f} V'.format(v=self.Device.get_bias(self.Channel)) if self.Device.get_status(self.Channel) else '---')
+    def set_voltage_label(self, reading=None):
+        reading = self.Device.get_reading(self.Channel) if reading is None else reading
+        self.VoltageLabel.setText('{v:4.0f} V'.format(v=reading.Voltage) if self.Device.get_status(self.Channel) else '---')
         format_widget(self.VoltageLabel, color='darkCyan', font_size=DeviceBox.FONTSIZE * 2, bold=True, font='ubuntu')
 
-    def set_current_label(self):
-        current = self.Device.get_current(self.Channel)
+    def set_current_label(self, reading=None):
+        current = (self.Device.get_reading(self.Channel) if reading is None else reading).Current
         self.set_current_unit(current)
         self.CurrentLabel.setText(u'{c:3.1f} {u}'.format(c=current / units[self.Unit], u=self.Unit) if self.Device.get_status(self.Channel) else '---')
         format_widget(self.CurrentLabel, color='red', font_size=DeviceBox.FONTSIZE * 2, bold=True, font='ubuntu')
@@ -142,18 +147,10 @@ class HVBox(DeviceBox):
     def create_ramp_button(self):
         button = make_button('Set Ramp Speed')
 
-        def f():
-            self.Device.set_ramp_speed(float(self.RampField.text()))
-
-        button.clicked.connect(f)
+        button.clicked.connect(self.set_ramp_speed)
         return button
 
     def create_on_button(self):
         button = make_button('OFF' if self.Device.get_status(self.Channel) else 'ON', size=50, height=DeviceBox.HEIGHT * 2)
-
-        def change_output():
-            self.Device.power_down(self.Channel) if self.Device.get_status(self.Channel) else self.Device.set_output(ON, self.Channel)
-            button.setText('ON' if self.Device.get_status(self.Channel) else 'OFF')
-
-        button.clicked.connect(change_output)
+        button.clicked.connect(self.set_output)
         return button
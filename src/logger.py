@@ -6,7 +6,7 @@
 # --------------------------------------------------------
 
 
-from logging import getLogger, FileHandler, INFO, Formatter
+from logging import getLogger, FileHandler, INFO, WARNING, Formatter
 from os.path import join, realpath, dirname, basename
 from src.utils import ensure_dir, info, load_config, message
 from time import strftime
@@ -71,12 +71,19 @@ class Logger:
     def create_new_log_file(self):
         self.configure()
 
-    def add_entry(self, txt, prnt=False):
+    def add_entry(self, txt, prnt=False, t=None):
+        """ :param t: time stamp of the entry, the current time if None. """
         if prnt:
             info('{}\t{}\tCH{}'.format(txt, self.DeviceName, self.Channel))
-        self.Logger.warning('{}\t{}'.format(txt, self.get_dut_name()))
-
-    def write_log(self, status, bias, current, is_ramping, target_bias, prnt=False):
+        msg = '{}\t{}'.format(txt, self.get_dut_name())
+        if t is None:
+            self.Logger.warning(msg)
+        else:
+            record = self.Logger.makeRecord(self.Logger.name, WARNING, __file__, 0, msg, None, None)
+            record.created, record.msecs = t, (t % 1) * 1000
+            self.Logger.handle(record)
+
+    def write_log(self, status, bias, current, is_ramping, target_bias, prnt=False, t=None):
         if strftime('%d') != self.Day:
             self.create_new_log_file()
         if status != self.LastStatus and self.LastStatus is not None:
@@ -86,7 +93,7 @@ class Logger:
         # only write measurements when device is ON
         if not status:
             return
-        self.add_entry('{v:10.3e} {c:10.3e}'.format(v=bias, c=current), prnt=prnt)
+        self.add_entry('{v:10.3e} {c:10.3e}'.format(v=bias, c=current), prnt=prnt, t=t)
         # write when ramping starts
         if is_ramping and not self.WasRamping:
             self.add_entry('START_RAMPING_AT {0:7.1f}'.format(bias), prnt=prnt)
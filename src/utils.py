@@ -209,8 +209,12 @@ def remove_digits(string):
     return ''.join(filter(lambda x: not x.isdigit(), string))
 
 
+StrangeChars = str.maketrans('', '', '\r\n\x00\x13\x11\x10')
+
+
 def clear_string(data):
-    data = data.translate(None, '\r\n\x00\x13\x11\x10')  # clear strange chars
+    data = data.decode('ascii', errors='replace') if isinstance(data, (bytes, bytearray)) else data
+    data = data.translate(StrangeChars)  # clear strange chars
     return data.replace(',', ' ').strip()
 
 